@@ -14,6 +14,10 @@ solar_irradiance = {'ats': 254.752,
 # sza > 101 deg VIIRS Elvidge et al., 2017
 day_night_angle = 101  # degrees
 
+# margin applied to the SLSTR tie point solar zenith angles when screening
+# out daytime products, covering overshoot of the spline interpolation
+sls_tie_point_sza_margin = 5  # degrees
+
 # flare detection limit, based on min value in ATS.
 atx_swir_threshold = 0.06  # W m2 sr-1 um-1
 
@@ -29,8 +33,52 @@ sls_cloud_window_size = 33  # pixels
 # mwir background window size
 atx_background_window_size = 17  # pixels
 
+# number of image rows processed at once by the detectors, which bounds
+# their memory use (None processes the whole product at once)
+detector_tile_rows = None
+
+# floating point dtype of the continuous detector fields (radiances, angles,
+# pixel sizes and FRP), flags are unaffected by the choice of dtype
+detector_dtype = 'float64'
+
+# number of tiles processed concurrently by the detectors (when greater than one
+# and detector_tile_rows is None the product is split evenly between the threads)
+detector_threads = 1
+
+# number of reads issued concurrently when a product is read into memory (the
+# SLSTR members decompressed, or the chunks of an ATSR product prefetched), which
+# overlaps the round trip latency of the reads on a parallel filesystem
+product_read_threads = 4
+
+# number of products queued between the reader, detector and writer stages
+# of the multi-product workers, i.e. the number of products prefetched
+pipeline_depth = 1
+
+# maximum size of the preprocessed product cache
+product_cache_max_bytes = 500 * 1024 ** 3  # bytes
+
 # fire radiative power caluclation coefficients
 frp_coeff = {'sls': const.sigma / 8.19919059044e-09,
              'ats': const.sigma / 8.29908189231e-09,
              'at2': const.sigma / 8.2215268253e-09,
              'at1': const.sigma / 8.23565040885e-09}
+
+# dtypes used when reading the L2 csv outputs, columns not
+# listed here are dropped unless explicitly requested
+csv_dtypes = {'cell': 'int32',
+              'year': 'int16',
+              'month': 'int8',
+              'day': 'int8',
+              'hhmm': 'str',
+              'sensor': 'str',
+              'line': 'int32',
+              'sample': 'int16',
+              'latitude': 'float32',
+              'longitude': 'float32',
+              'local_cloudiness': 'float32',
+              'swir_16': 'float32',
+              'swir_22': 'float32',
+              'frp': 'float32',
+              'pixel_size': 'float32',
+              'mwir': 'float32',
+              'background_mwir': 'float32'}
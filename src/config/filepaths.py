@@ -9,7 +9,6 @@ jasmin_root = '/home/users/dnfisher/projects/kcl-globalgasflaring/'
 
 # path to ggf code
 script_temp = jasmin_root + 'src/scripts/'
-slstr_extract_temp = jasmin_root + 'src/data/'
 
 # Paths to ATSR data on CEMS (setup for recursive glob searching)
 products = {'ats': '/neodc/aatsr_multimission/aatsr-v3/data/ats_toa_1p/**/*.N1',
@@ -22,11 +21,15 @@ output_root = '/group_workspaces/jasmin2/nceo_aerosolfire/data/temp/'
 output_l2 = output_root + 'processed/l2/'
 output_l3 = output_root + 'processed/l3/'
 
+# Path to the preprocessed product cache shared by the hotspots
+# and flares stages (set to None to disable caching)
+product_cache = None  # e.g. output_root + 'product_cache/'
+
 # Paths for product searching during data aggregation steps
 # (setup for recursive glob searching)
 # TODO naming of stages put into constants to ensure consistency
-atx_hotspots = output_l2 + '**/*AT*hotspots.csv'
-sls_hotspots = output_l2 + '**/*S3*hotspots.csv'
+atx_hotspots = output_l2 + '**/*AT*hotspots.npz'
+sls_hotspots = output_l2 + '**/*S3*hotspots.npz'
 atx_flares = output_l2 + '**/*AT*flares.csv'
 sls_flares = output_l2 + '**/*S3*flares.csv'
 atx_sampling = output_l2 + '**/*AT*samples.csv'
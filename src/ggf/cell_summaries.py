@@ -0,0 +1,83 @@
+'''
+Orbit level summaries of the hotspot detections on the arcminute grid
+(see src.ggf.gridcells).  The hotspot pixels of an orbit are reduced to
+one record per grid cell, holding the number of hotspot pixels and the
+maximum and mean SWIR radiance of the cell.  Summaries are stored as
+compressed .npz files holding one array per column, with the orbit time
+and sensor (shared by all records) stored once, so they are far smaller
+than the per pixel CSV output and any subset of columns can be loaded.
+'''
+import numpy as np
+import pandas as pd
+
+import src.config.constants as proc_const
+
+# per cell columns and their dtypes
+columns = {'cell': np.int32,
+           'pixel_count': np.int32,
+           'swir_16_max': np.float32,
+           'swir_16_mean': np.float32}
+
+# columns shared by all the cells of an orbit
+orbit_columns = ['year', 'month', 'day', 'hhmm', 'sensor']
+
+
+def summarise(df, orbit) -> dict:
+    """
+    Reduces the hotspot pixels of an orbit to one record per grid cell.
+
+    Args:
+        df: Hotspot pixel dataframe holding the cell and swir_16 columns
+        orbit: Dictionary of the orbit columns (e.g. the detector datetime_info and sensor)
+
+    Returns:
+        Dictionary of the summary columns
+    """
+    cells, cell_index, counts = np.unique(df['cell'].values, return_inverse=True, return_counts=True)
+    swir_16 = df['swir_16'].values.astype(np.float64)
+    swir_16_max = np.full(cells.size, -np.inf)
+    np.maximum.at(swir_16_max, cell_index, swir_16)
+    swir_16_sum = np.bincount(cell_index, weights=swir_16, minlength=cells.size)
+
+    summary = {'cell': cells,
+               'pixel_count': counts,
+               'swir_16_max': swir_16_max,
+               'swir_16_mean': swir_16_sum / np.maximum(counts, 1)}
+    summary = {k: v.astype(columns[k]) for k, v in summary.items()}
+    for k in orbit_columns:
+        summary[k] = np.array(orbit[k]).astype(proc_const.csv_dtypes[k])
+    return summary
+
+
+def save(summary, path) -> None:
+    """
+    Writes an orbit summary to disk in compressed .npz format.
+
+    Args:
+        summary: Dictionary of the summary columns
+        path: Output file path
+
+    Returns:
+        None
+    """
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **summary)
+
+
+def load(path, cols=None) -> pd.DataFrame:
+    """
+    Loads an orbit summary, repeating the orbit columns for each record.
+
+    Args:
+        path: Summary file path
+        cols: Columns to load (all if None)
+
+    Returns:
+        Dataframe of the summary records
+    """
+    if cols is None:
+        cols = list(columns) + orbit_columns
+    with np.load(path) as summary:
+        n_records = summary['cell'].size
+        return pd.DataFrame({k: np.repeat(summary[k], n_records) if k in orbit_columns else summary[k]
+                             for k in cols})
@@ -1,15 +1,133 @@
 from abc import ABC, abstractmethod
+import copy
+import threading
 import pandas as pd
 import numpy as np
 from scipy.interpolate import RectBivariateSpline
-from skimage.filters import rank
-from skimage.morphology import square
-from scipy.ndimage import convolve
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 import src.config.constants as proc_const
 from src.models import atsr_pixel_size
 from src.models import slstr_pixel_size
+from src.ggf import window_stats
+from src.ggf import persistent_index as pindex
+from src.ggf import gridcells
+
+
+@lru_cache(maxsize=None)
+def pixel_size_vector(sensor) -> np.ndarray:
+    """
+    Per column (across track) pixel sizes of the sensor, which are
+    computed once per interpreter and shared by all detectors.
+
+    Args:
+        sensor: Sensor code string
+
+    Returns:
+        Read only array of pixel sizes (m^2)
+    """
+    if sensor == 'sls':
+        pixel_size = np.array(slstr_pixel_size.pixel_size) * 1000000
+    else:
+        pixel_size = atsr_pixel_size.compute() * 1000000  # km^2 to m^2
+    pixel_size.flags.writeable = False
+    return pixel_size
+
+
+def _row_windows(flagged_rows, halo) -> list:
+    """
+    Finds the contiguous windows of image rows covering the flagged
+    rows, with each flagged row extended by a halo of rows either side.
+
+    Args:
+        flagged_rows: Boolean flag for each image row
+        halo: Number of rows added either side of each flagged row
+
+    Returns:
+        List of (start, stop) row windows
+    """
+    flagged_rows = np.asarray(flagged_rows, dtype=bool)
+    if halo:
+        flagged_rows = window_stats.window_sum(flagged_rows[:, None], 2 * halo + 1)[:, 0] > 0
+    edges = np.diff(np.concatenate([[0], flagged_rows.astype(np.int8), [0]]))
+    return [(int(start), int(stop)) for start, stop in zip(np.where(edges == 1)[0], np.where(edges == -1)[0])]
+
+
+def _windows_from_rows(rows) -> list:
+    """
+    Groups an increasing sequence of image rows into contiguous row windows.
+
+    Args:
+        rows: Increasing image row indices
+
+    Returns:
+        List of (start, stop) row windows
+    """
+    breaks = np.where(np.diff(rows) != 1)[0] + 1
+    starts = rows[np.concatenate([[0], breaks])]
+    stops = rows[np.concatenate([breaks - 1, [rows.size - 1]])] + 1
+    return [(int(start), int(stop)) for start, stop in zip(starts, stops)]
+
+
+def _unpack(counts, packing) -> np.ndarray:
+    """
+    Converts the packed counts of a NetCDF variable to physical units
+    using its CF packing attributes, in the same way as the netCDF4 auto
+    mask and scale, with the invalid counts set to zero.
+
+    Args:
+        counts: Packed counts
+        packing: Record of the packing attributes of the variable
+
+    Returns:
+        The unpacked data
+    """
+    names = packing.dtype.names
+    invalid = np.zeros(counts.shape, dtype=bool)
+    for k in ['_FillValue', 'missing_value']:
+        if k in names:
+            invalid |= np.isin(counts, packing[k][0])
+    valid_min, valid_max = packing['valid_range'][0] if 'valid_range' in names else (None, None)
+    valid_min = packing['valid_min'][0] if 'valid_min' in names else valid_min
+    valid_max = packing['valid_max'][0] if 'valid_max' in names else valid_max
+    if valid_min is not None:
+        invalid |= counts < valid_min
+    if valid_max is not None:
+        invalid |= counts > valid_max
+
+    values = counts
+    if 'scale_factor' in names:
+        values = values * packing['scale_factor'][0]
+    if 'add_offset' in names:
+        values = values + packing['add_offset'][0]
+    return np.where(invalid, 0, values)
+
+
+def _count_threshold(thresh, packing, dtype):
+    """
+    Converts a threshold in physical units to the packed count domain
+    of a NetCDF variable (packed with a positive scale factor).  The count
+    threshold is lowered by a margin for the rounding of the unpacking, so
+    every count exceeding the physical threshold also exceeds it.
+
+    Args:
+        thresh: Threshold in physical units
+        packing: Record of the packing attributes of the variable
+        dtype: Dtype of the packed counts
+
+    Returns:
+        The count threshold
+    """
+    names = packing.dtype.names
+    scale = float(packing['scale_factor'][0]) if 'scale_factor' in names else 1.0
+    offset = float(packing['add_offset'][0]) if 'add_offset' in names else 0.0
+    count_thresh = (thresh - offset) / scale
+    count_thresh -= abs(count_thresh) * 1e-4 + 1
+    if np.issubdtype(dtype, np.integer):
+        return int(np.floor(count_thresh))
+    return count_thresh
 
 
 class BaseDetector(ABC):
@@ -17,21 +135,32 @@ class BaseDetector(ABC):
     def __init__(self,
                  day_night_angle=None,
                  swir_thresh=None,
-                 cloud_window_size=None):
+                 cloud_window_size=None,
+                 dtype=np.float64):
 
         """
         BaseDetector base class that contains all the shared attributes
         and methods used by the child classes that inherit from it.
 
+        The dtype sets the maximum precision in which the continuous fields
+        (radiances, angles, pixel sizes and FRP) are held once the hotspot, night
+        and view angle flags have been computed.  The flags are always computed at the
+        precision the data are read in, so they do not depend on the dtype.
+        With float32 the continuous fields are within a relative error of 1e-6
+        of the float64 results, and the window statistics (which are accumulated
+        in float64) within a relative error of 1e-6.
+
         Args:
             day_night_angle: Solar zenith angle that defines the day/night boundary
             swir_thresh: Threshold which hotspots must exceed to be detected
             cloud_window_size: Image window over which local cloud statistics are computed
+            dtype: Floating point dtype of the continuous fields
         """
 
         self.day_night_angle = day_night_angle
         self.swir_thresh = swir_thresh
         self.cloud_window_size = cloud_window_size
+        self.dtype = np.dtype(dtype)
         self.sensor = None
 
         # setup attributes generated
@@ -53,6 +182,184 @@ class BaseDetector(ABC):
         self.frp = None
         self.hotspots = None
         self.datetime_info = None
+        self.empty = False
+
+        # original line of each row held in the arrays, if only some rows are read,
+        # the (start, stop) windows of those rows, and the rows output in tiled runs
+        self.rows = None
+        self.row_windows = None
+        self.core = None
+
+        # optional cache of the arrays read from the product
+        self.cache = None
+        self.product_id = None
+
+        # serialises product and cache access when tiles are processed on threads
+        self._io_lock = threading.RLock()
+
+        # window statistics evaluated only at the pixels output by to_dataframe
+        self._pointwise = {}
+
+    def _cached(self, name, read) -> np.ndarray:
+        """
+        Reads an array from the product cache if it is held there,
+        otherwise reads it from the product (storing it in the cache
+        if one is in use).
+
+        Args:
+            name: Name of the array in the cache
+            read: Function reading the array from the product
+
+        Returns:
+            The array
+        """
+        with self._io_lock:
+            if self.cache is None:
+                return read()
+            array = self.cache.get(self.product_id, name)
+            if array is None:
+                if self.product is None:
+                    raise KeyError(name + ' not found in product cache for ' + self.product_id)
+                array = read()
+                self.cache.put(self.product_id, name, array)
+            return array
+
+    def _cached_rows(self, name, read, block_rows=1024) -> np.ndarray:
+        """
+        Loads an array of image rows from the product cache, first storing
+        it there block by block of rows if it is not held, so that the full
+        array is never read into memory (the cached array is memory mapped).
+
+        Args:
+            name: Name of the array in the cache
+            read: Function reading the array from the product for a list of row windows
+            block_rows: Number of rows read at once when the array is stored
+
+        Returns:
+            The array
+        """
+        with self._io_lock:
+            array = self.cache.get(self.product_id, name)
+            if array is None:
+                if self.product is None:
+                    raise KeyError(name + ' not found in product cache for ' + self.product_id)
+                self.cache.put_rows(self.product_id, name, self._scene_rows(),
+                                    lambda start, stop: read([(start, stop)]), block_rows)
+                array = self.cache.get(self.product_id, name)
+            return array
+
+    def _load_rows(self, name, read) -> np.ndarray:
+        """
+        Loads the selected row windows of an array (all rows if no
+        windows are selected).  If a product cache is in use the full array
+        is cached, so that it can be shared by all processing stages, and
+        the rows are then taken from it.
+
+        Args:
+            name: Name of the array in the cache
+            read: Function reading the array from the product for a list of row windows
+
+        Returns:
+            The array rows
+        """
+        return self._load_windows(name, read, self.row_windows)
+
+    def _load_windows(self, name, read, windows) -> np.ndarray:
+        """
+        Loads the given row windows of an array (all rows if windows
+        is None), taking them from the product cache if one is in use.
+
+        Args:
+            name: Name of the array in the cache
+            read: Function reading the array from the product for a list of row windows
+            windows: List of (start, stop) row windows
+
+        Returns:
+            The array rows
+        """
+        if self.cache is None:
+            return read(windows)
+        array = self._cached_rows(name, read)
+        if windows is None:
+            return array
+        stack = np.ma.concatenate if np.ma.isMaskedArray(array) else np.concatenate
+        return stack([array[start:stop] for start, stop in windows])
+
+    def _window_halo(self) -> int:
+        """
+        Number of rows either side of a pixel that are used by
+        the window statistics.
+
+        Returns:
+            The halo size in rows
+        """
+        return self.cloud_window_size // 2
+
+    def _load_cached_metadata(self) -> None:
+        """
+        Sets the sensor and datetime information from the product
+        cache, used when the product itself has not been opened.
+
+        Returns:
+            None
+        """
+        meta = self.cache.get_meta(self.product_id)
+        if meta is None:
+            raise KeyError(self.product_id + ' not found in product cache')
+        self.sensor = meta['sensor']
+        self.datetime_info = meta['datetime_info']
+
+    def _complete_cache_entry(self) -> None:
+        """
+        Stores the product metadata once all arrays have been
+        read, which marks the cache entry as complete.
+
+        Returns:
+            None
+        """
+        if self.cache is not None and not self.cache.contains(self.product_id):
+            self.cache.put_meta(self.product_id, {'sensor': self.sensor,
+                                                  'datetime_info': self.datetime_info})
+
+    def _end_empty_product(self) -> None:
+        """
+        Flags that the product contains no pixels to be processed (e.g.
+        no night time pixels), so that no further data is read and empty
+        results are returned.
+
+        Returns:
+            None
+        """
+        self.empty = True
+
+    def _apply_dtype(self) -> None:
+        """
+        Casts the continuous fields held at a higher precision than the
+        detector dtype down to it, which must only be done once all flags
+        have been computed from them.
+
+        Returns:
+            None
+        """
+        for k in ['sza', 'vza', 'swir_16', 'swir_22', 'mwir']:
+            array = getattr(self, k, None)
+            if array is not None:
+                setattr(self, k, self._as_dtype(array))
+
+    def _as_dtype(self, array) -> np.ndarray:
+        """
+        Casts an array held at a higher precision than the detector
+        dtype down to it.
+
+        Args:
+            array: Floating point array
+
+        Returns:
+            The array at no more than the detector precision
+        """
+        if array.dtype.itemsize > self.dtype.itemsize:
+            return array.astype(self.dtype)
+        return array
 
     def _make_night_mask(self) -> None:
         """
@@ -83,7 +390,48 @@ class BaseDetector(ABC):
         Returns:
             None
         """
-        self.frp = self.pixel_size * proc_const.frp_coeff[self.sensor] * self.swir_16 / 1000000  # in MW
+        lines, samples = np.indices(self.pixel_size.shape)
+        self.frp = self._frp_at(lines, samples)
+
+    def _frp_at(self, lines, samples) -> np.ndarray:
+        """
+        Computes the pixel fire radiative power only at the given pixels.
+
+        Args:
+            lines: Line indices of the pixels
+            samples: Sample indices of the pixels
+
+        Returns:
+            The fire radiative power at each pixel (MW)
+        """
+        pixel_size = self.pixel_size[lines, samples]
+        return pixel_size * proc_const.frp_coeff[self.sensor] * self._swir_16_at(lines, samples) / 1000000  # in MW
+
+    def _swir_16_at(self, lines, samples) -> np.ndarray:
+        """
+        Returns the 1.6 micron SWIR radiances at the given pixels.
+
+        Args:
+            lines: Line indices of the pixels
+            samples: Sample indices of the pixels
+
+        Returns:
+            The SWIR radiance at each pixel (W m-2 sr-1 um-1)
+        """
+        return self.swir_16[lines, samples]
+
+    def _broadcast_pixel_size(self, shape) -> np.ndarray:
+        """
+        Broadcasts the per column pixel sizes over the image as a read
+        only view, so that no full image array is allocated.
+
+        Args:
+            shape: Shape of the image
+
+        Returns:
+            Pixel size (m^2) view of the image shape
+        """
+        return np.broadcast_to(pixel_size_vector(self.sensor).astype(self.dtype, copy=False), shape)
 
     def _compute_local_cloudiness(self) -> None:
         """
@@ -92,102 +440,214 @@ class BaseDetector(ABC):
         Returns:
             None
         """
-        # k = np.ones([self.cloud_window_size, self.cloud_window_size])
-        # s = convolve(self.cloudy.astype(int), k, mode='constant', cval=0.0)
-        # count = convolve(np.ones(self.cloudy.shape), k, mode='constant', cval=0.0)
-        # self.local_cloudiness = s/count
-        selem = square(self.cloud_window_size)
-        self.local_cloudiness = rank.mean(self.cloudy.astype(int), selem)
+        self.local_cloudiness = window_stats.window_mean(self.cloudy, self.cloud_window_size)
+
+    def _local_cloudiness_at(self, lines, samples) -> np.ndarray:
+        """
+        Computes the local mean cloudiness only at the given pixels.
+
+        Args:
+            lines: Line indices of the pixels
+            samples: Sample indices of the pixels
+
+        Returns:
+            The local mean cloudiness at each pixel
+        """
+        return window_stats.point_mean(self.cloudy, self.cloud_window_size, lines, samples)
 
-    def _build_dataframe(self, keys, sampling=False, joining_df=None) -> pd.DataFrame:
+    def _build_dataframe(self, keys, sampling=False, joining_df=None, persistent_index=None) -> pd.DataFrame:
         """
         A flexible dataframe builder that takes in a set of keys that
         correspond to data contained within the object.  For each item
         of data, the samples associated with hotspot activity are selected
-        using the provided mask.  The joining_df keyword allows the dataframe
-        to be reduced as is sometimes required in the processing chain.
+        using the provided mask.  The joining_df and persistent_index keywords
+        allow the dataframe to be reduced as is sometimes required in the
+        processing chain.
 
         Args:
             keys: The variables to be included in the dataframe (columns)
             sampling: Flag to determine if hotspot sampling is being evaluated
             joining_df: Used to reduce the dataframe through an Inner Join
+            persistent_index: Grid cell index used to reduce the dataframe to contained cells
 
         Returns:
             Dataframe containing the requested data defined by the input
             keys, flag, mask and, if included, the reducing dataframe.
 
         """
-        df = pd.DataFrame()
+        # reduce the pixels before building the dataframe
+        if joining_df is not None:
+            persistent_index = pindex.build(joining_df['cell'].values)
 
-        # store data associated with product
+        if self.empty:
+            lines = samples = np.zeros(0, dtype=np.int64)
+        elif not sampling:
+            lines, samples = np.where(self.hotspots)
+            if persistent_index is not None:
+                retained = pindex.contains(persistent_index,
+                                           gridcells.encode(self.latitude[lines, samples],
+                                                            self.longitude[lines, samples]))
+                lines, samples = lines[retained], samples[retained]
+        elif persistent_index is not None:
+            lines, samples = self._find_joined_pixels(persistent_index)
+        else:
+            lines, samples = np.where(self.night_mask)
+
+        # tiled runs only output the pixels in the tile core (i.e. not the halo)
+        if self.core is not None:
+            in_core = (lines >= self.core[0]) & (lines < self.core[1])
+            lines, samples = lines[in_core], samples[in_core]
+
+        df = pd.DataFrame(index=pd.RangeIndex(lines.size))
+
+        # store data associated with product, window statistics are
+        # evaluated after the join so that only retained pixels are used
+        pointwise_keys = []
         for k in keys:
             if k not in self.__dict__:
                 raise KeyError(k + ' not found in available attributes')
             if self.__dict__[k] is None:
+                if k in self._pointwise:
+                    pointwise_keys.append(k)
+                    df[k] = np.nan
+                elif self.empty:
+                    df[k] = np.nan
                 continue
-            if sampling:
-                df[k] = self.__dict__[k]  # Get everything then reduce in the join
-            else:
-                df[k] = self.__dict__[k][self.hotspots]
+            df[k] = self.__dict__[k][lines, samples]
 
         # store additional derived data
-        if not sampling:
-            lines, samples = np.where(self.hotspots)
-            df['line'] = lines
-            df['sample'] = samples
-        df['grid_x'] = self._find_arcmin_gridcell(df['latitude'])
-        df['grid_y'] = self._find_arcmin_gridcell(df['longitude'])
+        df['line'] = lines
+        df['sample'] = samples
+        df['cell'] = gridcells.encode(df['latitude'].values, df['longitude'].values)
         for time_period in self.datetime_info:
             df[time_period] = self.datetime_info[time_period]
         df['sensor'] = self.sensor
 
         if joining_df is not None:
-            df = pd.merge(joining_df, df, on=['grid_x', 'grid_y'])
+            df = pd.merge(joining_df, df, on='cell')
+        for k in pointwise_keys:
+            df[k] = self._pointwise[k](df['line'].values, df['sample'].values)
+        if self.rows is not None:
+            df['line'] = self.rows[df['line'].values]
+        if sampling:
+            df = df.drop(columns=['line', 'sample'])
         return df
 
-    @staticmethod
-    def _find_arcmin_gridcell(coordinates):
+    def _find_joined_pixels(self, persistent_index, chunk_rows=1024):
         """
-        Ingests cartesian coordinates and rescales them
-        to an integer representation of a 1-arminute grid.
-        This is an approximate representation and is used
-        solely for aggregation purposes (i.e. cannot be
-        used for visualisation).
+        Finds the night pixels whose arcminute grid cell is contained in
+        the persistent location index, without building a dataframe of the
+        full image.  The image is processed in blocks of rows to bound
+        memory use.
 
         Args:
-            coordinates: A set of cartesian coordinates
+            persistent_index: Grid cell index of the cells to retain
+            chunk_rows: Number of image rows evaluated at once
 
         Returns:
-            An integer value corresponding to an arcminute gridcell
-
+            The line and sample indices of the retained pixels
         """
-        neg_values = coordinates < 0
-
-        abs_x = np.abs(coordinates)
-        floor_x = np.floor(abs_x)
-        decile = abs_x - floor_x
-        minute = np.around(decile * 60)  # round to nearest arcmin
-        minute_fraction = minute * 0.01  # convert to fractional value (ranges from 0 to 0.6)
-
-        max_minute = minute_fraction > 0.59
+        lines = []
+        samples = []
+        for start in range(0, self.latitude.shape[0], chunk_rows):
+            cells = gridcells.encode(self.latitude[start:start + chunk_rows],
+                                     self.longitude[start:start + chunk_rows])
+            retained = pindex.contains(persistent_index, cells) & self.night_mask[start:start + chunk_rows]
+            chunk_lines, chunk_samples = np.where(retained)
+            lines.append(chunk_lines + start)
+            samples.append(chunk_samples)
+        return np.concatenate(lines), np.concatenate(samples)
+
+    def run_tiled(self, requests, tile_rows=None, flares_or_sampling=False, threads=1, **kwargs) -> list:
+        """
+        Runs the detector over tiles of image rows, so that the arrays
+        for only a few tiles are held in memory at once, and returns the
+        dataframes for each request.  Each tile is read with a halo of rows
+        sized to the largest statistics window and only the pixels in the
+        tile core are output, so the results are identical to those of an
+        untiled run_detector followed by to_dataframe.  Tiles can be processed
+        concurrently on a thread pool, in which case reads from the product
+        are serialised and the outputs are concatenated in tile order.
 
-        floor_x[neg_values] *= -1
-        floor_x[neg_values] -= minute_fraction[neg_values]
-        floor_x[~neg_values] += minute_fraction[~neg_values]
+        Args:
+            requests: List of to_dataframe keyword argument dictionaries
+            tile_rows: Number of rows per tile (if None the product is split evenly between the threads)
+            flares_or_sampling: flag to set processing level
+            threads: Number of tiles processed concurrently
+            kwargs: Additional keyword arguments of run_detector
 
-        # deal with edge cases - just round them all up
-        if np.sum(max_minute) > 0:
-            floor_x[max_minute] = np.around(floor_x[max_minute])
+        Returns:
+            List holding the dataframe for each request
+        """
+        if tile_rows is None and threads == 1:
+            self.run_detector(flares_or_sampling, **kwargs)
+            return [self.to_dataframe(**request) for request in requests]
+        if not self._prepare(flares_or_sampling, **kwargs):
+            return [self.to_dataframe(**request) for request in requests]
+
+        rows = self.rows if self.rows is not None else np.arange(self._scene_rows())
+        halo = self._window_halo() if flares_or_sampling else 0
+        if tile_rows is None:
+            tile_rows = -(-rows.size // threads)
+
+        tiles = []
+        for start in range(0, rows.size, tile_rows):
+            stop = min(start + tile_rows, rows.size)
+            tile_start = max(start - halo, 0)
+            tiles.append((rows[tile_start:stop + halo], (start - tile_start, stop - tile_start)))
+
+        def run_tile(tile):
+            return self._run_tile(tile, requests, flares_or_sampling)
+
+        if threads == 1:
+            tile_frames = list(map(run_tile, tiles))
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                tile_frames = list(pool.map(run_tile, tiles))
+        return [pd.concat(frames, ignore_index=True) for frames in zip(*tile_frames)]
+
+    def _run_tile(self, tile, requests, flares_or_sampling) -> list:
+        """
+        Runs the detector on a single tile, using a shallow copy of
+        the detector so that tiles can be processed concurrently.
 
-        # rescale
-        floor_x = (floor_x * 100).astype(int)
+        Args:
+            tile: The image rows of the tile and the (start, stop) of its core within them
+            requests: List of to_dataframe keyword argument dictionaries
+            flares_or_sampling: flag to set processing level
 
-        return floor_x
+        Returns:
+            List holding the tile dataframe for each request
+        """
+        detector = copy.copy(self)
+        detector.rows, detector.core = tile
+        detector.row_windows = _windows_from_rows(detector.rows)
+        detector.sza = detector.night_mask = None  # read for each tile
+        detector._pointwise = {}
+        detector._process_rows(flares_or_sampling)
+        frames = [detector.to_dataframe(**request) for request in requests]
+
+        # the point-wise evaluators are bound to the tile detector, so they are dropped to
+        # free the tile arrays as soon as the tile is done (rather than when the cycle is collected)
+        detector._pointwise = {}
+        return frames
 
     @abstractmethod
     def _load_arrays(self) -> None:
         raise NotImplementedError("Must override _load_arrays")
 
+    @abstractmethod
+    def _scene_rows(self) -> int:
+        raise NotImplementedError("Must override _scene_rows")
+
+    @abstractmethod
+    def _prepare(self, flares_or_sampling) -> bool:
+        raise NotImplementedError("Must override _prepare")
+
+    @abstractmethod
+    def _process_rows(self, flares_or_sampling) -> None:
+        raise NotImplementedError("Must override _process_rows")
+
     @abstractmethod
     def _extract_datetime(self) -> None:
         raise NotImplementedError("Must override _extract_datetime")
@@ -208,22 +668,39 @@ class ATXDetector(BaseDetector):
                  day_night_angle=proc_const.day_night_angle,
                  swir_thresh=proc_const.atx_swir_threshold,
                  cloud_window_size=proc_const.atx_cloud_window_size,
-                 background_window_size=proc_const.atx_background_window_size):
+                 background_window_size=proc_const.atx_background_window_size,
+                 cache=None,
+                 product_id=None,
+                 dtype=proc_const.detector_dtype):
         """
         Detector implementation for the Along Track Scanning Radiomter
         instruments (ATSR-1, ATSR-2, AATSR).
         Args:
-            product: An ATSR product
+            product: An ATSR product (can be None if the product is held in the cache)
             day_night_angle: Solar zenith angle that defines the day/night boundary
             swir_thresh: Threshold which hotspots must exceed to be detected
             cloud_window_size: Image window over which local cloud statistics are computed
             background_window_size: Image window over which local MWIR background statistics are computed
+            cache: Optional ProductCache used to store and load the product arrays
+            product_id: Key of the product in the cache (defaults to the product id string)
+            dtype: Floating point dtype of the continuous fields
         """
-        super().__init__(day_night_angle, swir_thresh, cloud_window_size)
+        super().__init__(day_night_angle, swir_thresh, cloud_window_size, dtype)
         self.product = product
         self.background_window_size = background_window_size
-        self._define_sensor()
-        self._extract_datetime()
+        self.cache = cache
+
+        # the bands are held in their native units (reflectance and brightness temperature)
+        # and the SWIR and MWIR radiances are only computed at the pixels where they are used
+        self.swir_16_reflectance = None
+        self.mwir_brightness_temp = None
+        if product is None:
+            self.product_id = product_id
+            self._load_cached_metadata()
+        else:
+            self.product_id = product_id or product.id_string
+            self._define_sensor()
+            self._extract_datetime()
 
     def _extract_datetime(self) -> None:
         self.datetime_info = {'year': self.product.id_string[14:18],
@@ -251,19 +728,162 @@ class ATXDetector(BaseDetector):
         Returns:
             None
         """
-        self.latitude = self.product.get_band('latitude').read_as_array()
-        self.longitude = self.product.get_band('latitude').read_as_array()
-        self.cloud_free = self.product.get_band('cloud_flags_nadir').read_as_array() <= 1
-        self.pixel_size = np.tile(atsr_pixel_size.compute(), (self.cloud_free.shape[0], 1)) * 1000000  # km^2 to m^2
+        self.latitude = self._load_rows('latitude', lambda windows: self._read_band('latitude', windows))
+        self.longitude = self._load_rows('longitude', lambda windows: self._read_band('latitude', windows))
+        self.cloud_free = self._load_rows('cloud_free',
+                                          lambda windows: self._read_band('cloud_flags_nadir', windows) <= 1)
+        self.pixel_size = self._broadcast_pixel_size(self.cloud_free.shape)
+        self.swir_16_reflectance = self._load_rows('swir_16_reflectance',
+                                                   lambda windows: self._read_band('reflec_nadir_1600', windows))
+
+    def _load_mwir(self) -> None:
+        """
+        Loads the MWIR brightness temperatures, which are only needed
+        for the background statistics (but are always cached so that the
+        cache entry holds all the arrays used by either processing level).
 
-        swir_reflectance = self.product.get_band('reflec_nadir_1600').read_as_array()
-        self.swir_16 = np.nan_to_num(self._rad_from_ref(swir_reflectance))  # set nan's to zero
+        Returns:
+            None
+        """
+        self.mwir_brightness_temp = self._load_rows('mwir_brightness_temp',
+                                                    lambda windows: self._read_band('btemp_nadir_0370', windows))
+
+    def _swir_16_at(self, lines, samples) -> np.ndarray:
+        return self._as_dtype(self._swir_16_radiance(lines, samples))
+
+    def _swir_16_radiance(self, lines, samples) -> np.ndarray:
+        reflectances = self.swir_16_reflectance[lines, samples]
+        return np.nan_to_num(self._rad_from_ref(reflectances))  # set nan's to zero
+
+    def _mwir_at(self, lines, samples) -> np.ndarray:
+        """
+        Computes the MWIR radiances only at the given pixels.
+
+        Args:
+            lines: Line indices of the pixels
+            samples: Sample indices of the pixels
+
+        Returns:
+            The MWIR radiance at each pixel (W m-2 sr-1 um-1)
+        """
+        return self._as_dtype(self._rad_from_BT(3.7, self.mwir_brightness_temp[lines, samples]))
 
-        mwir_brightness_temp = self.product.get_band('btemp_nadir_0370').read_as_array()
-        self.mwir = self._rad_from_BT(3.7, mwir_brightness_temp)
+    def _detect_potential_hotspots(self) -> None:
+        """
+        Identifies pixels with raised signal in the SWIR imagery.  The
+        threshold is converted once to reflectance units and applied to the
+        reflectances, with a small margin for the rounding of the conversion,
+        and the few candidate pixels are then confirmed against the radiance
+        threshold, so that the flags are identical to thresholding the radiances.
 
-        solar_elev_angle_rad = np.deg2rad(self.product.get_band('sun_elev_nadir').read_as_array())
-        self.sza = np.rad2deg(np.arccos(np.sin(solar_elev_angle_rad)))
+        Returns:
+            None
+        """
+        ref_thresh = self._ref_from_rad(self.swir_thresh)
+        ref_thresh -= abs(ref_thresh) * 1e-4
+        lines, samples = np.where(self.swir_16_reflectance > ref_thresh)
+        self.potential_hotspots = np.zeros(self.swir_16_reflectance.shape, dtype=bool)
+        self.potential_hotspots[lines, samples] = self._swir_16_radiance(lines, samples) > self.swir_thresh
+
+    def _valid_mwir(self) -> np.ndarray:
+        """
+        Flags the pixels with a valid (positive) MWIR radiance.  The
+        radiance is positive for all brightness temperatures of at least
+        100 K, so it is only evaluated for the lower positive temperatures.
+
+        Returns:
+            Boolean mask of the valid pixels
+        """
+        b_temp = self.mwir_brightness_temp
+        valid = b_temp >= 100
+        lines, samples = np.where((b_temp > 0) & (b_temp < 100))
+        with np.errstate(over='ignore'):
+            valid[lines, samples] = self._rad_from_BT(3.7, b_temp[lines, samples]) > 0
+        return valid
+
+    def _read_band(self, name, windows=None) -> np.ndarray:
+        """
+        Reads a product band, or only the given row windows of the
+        band (stacked in order) using windowed raster reads.
+
+        Args:
+            name: Band name
+            windows: Optional list of (start, stop) row windows
+
+        Returns:
+            The band data
+        """
+        with self._io_lock:
+            band = self.product.get_band(name)
+            if windows is None:
+                return band.read_as_array()
+            width = self.product.get_scene_width()
+            return np.concatenate([band.read_as_array(width, stop - start, 0, start) for start, stop in windows])
+
+    def _scene_rows(self) -> int:
+        if self.product is None:
+            return self.cache.get(self.product_id, 'sza').shape[0]
+        return self.product.get_scene_height()
+
+    def _window_halo(self) -> int:
+        return max(self.cloud_window_size, self.background_window_size) // 2
+
+    def _flag_rows(self, persistent_index=None, block_rows=1024) -> tuple:
+        """
+        Flags the rows of the product containing night time pixels and, if
+        a persistent location index is given, the night rows also containing
+        a persistent location.  The product is screened in blocks of rows,
+        so that only one block of the solar geometry (and geolocation) is
+        held in memory at once, however long the orbit.
+
+        Args:
+            persistent_index: Optional grid cell index of the persistent locations
+            block_rows: Number of rows screened at once
+
+        Returns:
+            The night row flags and the selected row flags
+        """
+        n_rows = self._scene_rows()
+        night_rows = np.zeros(n_rows, dtype=bool)
+        selected_rows = np.zeros(n_rows, dtype=bool)
+        for start in range(0, n_rows, block_rows):
+            stop = min(start + block_rows, n_rows)
+            sza = self._load_windows('sza', self._read_sza, [(start, stop)])
+            night_rows[start:stop] = (sza >= self.day_night_angle).any(axis=1)
+            if persistent_index is None or not night_rows[start:stop].any():
+                continue
+
+            # geolocation is only read for the night rows of the block
+            windows = [(start + a, start + b) for a, b in _row_windows(night_rows[start:stop], 0)]
+            rows = np.concatenate([np.arange(a, b) for a, b in windows])
+            latitude = self._load_windows('latitude', lambda w: self._read_band('latitude', w), windows)
+            longitude = self._load_windows('longitude', lambda w: self._read_band('latitude', w), windows)
+            cells = gridcells.encode(latitude, longitude)
+            selected_rows[rows] = pindex.contains(persistent_index, cells).any(axis=1)
+        if persistent_index is None:
+            selected_rows = night_rows
+        return night_rows, selected_rows
+
+    def _select_rows(self, flares_or_sampling, selected_rows) -> None:
+        """
+        Selects the row windows of the product to be read, which include a
+        halo of rows so that the window statistics are unchanged.
+
+        Args:
+            flares_or_sampling: flag to set processing level (the halo is only needed for flares)
+            selected_rows: Flags of the rows to be processed
+
+        Returns:
+            None
+        """
+        halo = self._window_halo() if flares_or_sampling else 0
+        self.row_windows = _row_windows(selected_rows, halo)
+        if self.row_windows:
+            self.rows = np.concatenate([np.arange(start, stop) for start, stop in self.row_windows])
+
+    def _read_sza(self, windows=None) -> np.ndarray:
+        solar_elev_angle_rad = np.deg2rad(self._read_band('sun_elev_nadir', windows))
+        return np.rad2deg(np.arccos(np.sin(solar_elev_angle_rad)))
 
     def _rad_from_ref(self, reflectances):
         """
@@ -279,6 +899,20 @@ class ATXDetector(BaseDetector):
         se_dist = self._compute_sun_earth_distance() ** 2 / np.pi
         return reflectances / 100.0 * proc_const.solar_irradiance[self.sensor] * se_dist
 
+    def _ref_from_rad(self, radiances):
+        """
+        Converts from 1.6 micron SWIR spectral radiances to reflectances,
+        the inverse of _rad_from_ref.
+        Args:
+            radiances: 1.6 micron spectral radiances (W m-2 sr-1 um-1)
+
+        Returns:
+            1.6 micron reflectances
+
+        """
+        se_dist = self._compute_sun_earth_distance() ** 2 / np.pi
+        return radiances / (proc_const.solar_irradiance[self.sensor] * se_dist) * 100.0
+
     def _rad_from_BT(self, wvl, b_temp):
         """
         Converts from brightness temperatures to spectral radiances
@@ -303,7 +937,8 @@ class ATXDetector(BaseDetector):
             The Sun Earth distance at the time of observation
 
         """
-        doy = datetime.strptime(self.product.id_string[14:22], "%Y%m%d").timetuple().tm_yday
+        date = self.datetime_info['year'] + self.datetime_info['month'] + self.datetime_info['day']
+        doy = datetime.strptime(date, "%Y%m%d").timetuple().tm_yday
         return 1 + 0.01672 * np.sin(2 * np.pi * (doy - 93.5) / 365.0)
 
     def _compute_background(self):
@@ -317,63 +952,155 @@ class ATXDetector(BaseDetector):
             None
 
         """
-        valid_background = self.background_mask & (self.mwir > 0)
+        valid_background = self.background_mask
+        with np.errstate(divide='ignore', over='ignore'):
+            mwir = self._as_dtype(self._rad_from_BT(3.7, self.mwir_brightness_temp))
 
         # custom mean using only valid pixels
-        mwir_copy = self.mwir
-        mwir_copy[~valid_background] = 0
-        kernel = np.ones([self.background_window_size, self.background_window_size])
-        valid_background_pixel_count = convolve(valid_background.astype(int),
-                                                kernel,
-                                                mode='constant',
-                                                cval=0)
-        summed_mwir = convolve(mwir_copy,
-                               kernel,
-                               mode='constant',
-                               cval=0)
+        valid_mwir = np.where(valid_background, mwir, 0)
+        valid_background_pixel_count = window_stats.window_sum(valid_background, self.background_window_size)
+        summed_mwir = window_stats.window_sum(valid_mwir, self.background_window_size)
 
         # get proportion of valid background pixels in each window
-        valid_background_fraction = valid_background_pixel_count / float(kernel.sum())
-        self.background_mwir = np.nan_to_num(summed_mwir / valid_background_pixel_count)   # fill nans with zero
+        valid_background_fraction = valid_background_pixel_count / float(self.background_window_size ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.background_mwir = np.nan_to_num(summed_mwir / valid_background_pixel_count)   # fill nans with zero
         self.background_mwir[valid_background_fraction < proc_const.min_background_proportion] = proc_const.null_value
 
-    def run_detector(self, flares_or_sampling=False) -> None:
+    def _background_mwir_at(self, lines, samples, chunk_size=2 ** 22) -> np.ndarray:
+        """
+        Calculates the local mean background MWIR radiances only at the
+        given pixels, reading the background window around each pixel
+        directly.  Uses the same validity criteria as _compute_background.
+        Pixels are processed in chunks so that at most chunk_size window
+        elements are held in memory at once.
+
+        Args:
+            lines: Line indices of the pixels
+            samples: Sample indices of the pixels
+            chunk_size: Maximum number of window elements per chunk
+
+        Returns:
+            The local mean background MWIR radiance at each pixel
+
+        """
+        size = self.background_window_size
+        lines = np.asarray(lines)
+        samples = np.asarray(samples)
+        step = max(1, chunk_size // size ** 2)
+
+        valid_background_pixel_count = np.zeros(lines.size, dtype=np.int64)
+        summed_mwir = np.zeros(lines.size, dtype=np.float64)
+        for i in range(0, lines.size, step):
+            chunk = slice(i, i + step)
+            b_temp = window_stats.point_windows(self.mwir_brightness_temp, size, lines[chunk], samples[chunk])
+            with np.errstate(divide='ignore', over='ignore'):
+                mwir = self._as_dtype(self._rad_from_BT(3.7, b_temp))
+            valid_background = window_stats.point_windows(self.background_mask, size, lines[chunk], samples[chunk])
+            valid_background_pixel_count[chunk] = valid_background.sum(axis=(1, 2))
+            summed_mwir[chunk] = np.where(valid_background, mwir, 0).sum(axis=(1, 2), dtype=np.float64)
+
+        valid_background_fraction = valid_background_pixel_count / float(size ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            background_mwir = np.nan_to_num(summed_mwir / valid_background_pixel_count)
+        background_mwir[valid_background_fraction < proc_const.min_background_proportion] = proc_const.null_value
+        return background_mwir
+
+    def run_detector(self, flares_or_sampling=False, persistent_index=None) -> None:
         """
         Runs the detector methods on the input data.  If flares_or_sampling
         flag is set then additional processing is performed on fire radiative power,
-        local cloud cover and background radiance statistics.
+        local cloud cover and background radiance statistics.  The fire radiative power,
+        local cloud cover and background statistics are only evaluated at the pixels
+        returned by to_dataframe (i.e. after any persistent location join).  Products without
+        any night time pixels are screened out before the radiometric bands are read,
+        and otherwise only the rows containing night time pixels are read.  If a
+        persistent location index is given, only rows that also contain a persistent
+        location are read, and the same index must then be passed to to_dataframe.
 
         Args:
             flares_or_sampling: flag to set processing level
+            persistent_index: Optional grid cell index used to restrict the rows read
 
         Returns:
             None
         """
+        if self._prepare(flares_or_sampling, persistent_index):
+            self._process_rows(flares_or_sampling)
+
+    def _prepare(self, flares_or_sampling, persistent_index=None) -> bool:
+        """
+        Screens the product using the solar geometry and selects the
+        rows to be read.  The solar geometry of the selected rows is read
+        with the other arrays (by each tile in tiled runs).
+
+        Args:
+            flares_or_sampling: flag to set processing level
+            persistent_index: Optional grid cell index used to restrict the rows read
+
+        Returns:
+            False if the product holds no pixels to be processed
+        """
+        night_rows, selected_rows = self._flag_rows(persistent_index)
+        if not night_rows.any():
+            self._complete_cache_entry()
+            self._end_empty_product()
+            return False
+
+        self._select_rows(flares_or_sampling, selected_rows)
+        if not self.row_windows:
+            self._end_empty_product()
+            return False
+        return True
+
+    def _process_rows(self, flares_or_sampling) -> None:
+        """
+        Runs the detector on the selected rows of the product.
+
+        Args:
+            flares_or_sampling: flag to set processing level
+
+        Returns:
+            None
+        """
+        if self.sza is None:
+            self.sza = self._load_rows('sza', self._read_sza)
+            self._make_night_mask()
         self._load_arrays()
-        self._make_night_mask()
+        if flares_or_sampling or self.cache is not None:
+            self._load_mwir()
+        self._complete_cache_entry()
         self._detect_potential_hotspots()
         self.hotspots = self.potential_hotspots & self.night_mask
 
         if flares_or_sampling:
-            self.background_mask = ~self.potential_hotspots & self.cloud_free & self.night_mask
-            self._compute_frp()
+            # valid background pixels also require a valid (positive) MWIR radiance
+            self.background_mask = ~self.potential_hotspots & self.cloud_free & self.night_mask & self._valid_mwir()
             self.cloudy = ~self.potential_hotspots & ~self.cloud_free & self.night_mask
-            self._compute_local_cloudiness()
-            self._compute_background()
+        self._apply_dtype()
+
+        self._pointwise['swir_16'] = self._swir_16_at
+        if flares_or_sampling:
+            self._pointwise['mwir'] = self._mwir_at
+            self._pointwise['frp'] = self._frp_at
+            self._pointwise['local_cloudiness'] = self._local_cloudiness_at
+            self._pointwise['background_mwir'] = self._background_mwir_at
 
     def to_dataframe(self,
                      keys=None,
                      sampling=False,
-                     joining_df=None) -> pd.DataFrame:
+                     joining_df=None,
+                     persistent_index=None) -> pd.DataFrame:
         """
         Used to return a dataframe containing all needed information
         on the hotspots detected during the run_detector call.  The information
         returned is dependent on the keys provided, and if needed can be screened
-        using the joining_df keyword arg.
+        using the joining_df or persistent_index keyword args.
         Args:
             keys: The data required in the dataframe
             sampling: Flag to determine if hotspot sampling is being evaluated
             joining_df: An optional  joining dataframe that can be used to reduce the hotspots.
+            persistent_index: An optional grid cell index that can be used to reduce the hotspots.
 
         Returns:
             A dataframe containing the requested and possibly reduced data.
@@ -381,7 +1108,8 @@ class ATXDetector(BaseDetector):
         """
         if not('latitude' in keys and 'longitude' in keys):
             raise KeyError('At a minimum, latitude and longitude are required')
-        return self._build_dataframe(keys, sampling=sampling, joining_df=joining_df)
+        return self._build_dataframe(keys, sampling=sampling, joining_df=joining_df,
+                                     persistent_index=persistent_index)
 
 
 class SLSDetector(BaseDetector):
@@ -390,21 +1118,41 @@ class SLSDetector(BaseDetector):
                  product,
                  day_night_angle=proc_const.day_night_angle,
                  swir_thresh=proc_const.sls_swir_threshold,
-                 cloud_window_size=proc_const.sls_cloud_window_size):
+                 cloud_window_size=proc_const.sls_cloud_window_size,
+                 cache=None,
+                 product_id=None,
+                 dtype=proc_const.detector_dtype):
         """
         Detector implementation for the Sea and Land Surface Temperature Scanning (SLSTR)
         radiometer instrument series.
         Args:
-            product: SLSTR data product
+            product: SLSTR data product (can be None if the product is held in the cache)
             day_night_angle: Solar zenith angle that defines the day/night boundary
             swir_thresh: Threshold which hotspots must exceed to be detected
             cloud_window_size: Image window over which local cloud statistics are computed
+            cache: Optional ProductCache used to store and load the product arrays
+            product_id: Key of the product in the cache (required if a cache is used)
+            dtype: Floating point dtype of the continuous fields
         """
-        super().__init__(day_night_angle, swir_thresh, cloud_window_size)
+        super().__init__(day_night_angle, swir_thresh, cloud_window_size, dtype)
         self.product = product
         self.max_view_angle = proc_const.sls_vza_threshold  # degrees
         self.sensor = 'sls'
-        self._extract_datetime()
+        self.vza = None
+        self.vza_mask = None
+        self._an_xy = None
+
+        # the SWIR radiances are held as the packed counts of the product, and are
+        # only unpacked at the pixels where they are used
+        self.swir_16_counts = None
+        self.swir_22_counts = None
+        self._packing = {}
+        self.cache = cache
+        self.product_id = product_id
+        if product is None:
+            self._load_cached_metadata()
+        else:
+            self._extract_datetime()
 
     def _extract_datetime(self) -> None:
         dt_info = pd.Timestamp(self.product['time_an'].start_time)
@@ -419,35 +1167,183 @@ class SLSDetector(BaseDetector):
         Returns:
             None
         """
-        self.latitude = self.product['geodetic_an']['latitude_an'][:]
-        self.longitude = self.product['geodetic_an']['longitude_an'][:]
-        self.swir_16 = self.product['S5_radiance_an']['S5_radiance_an'][:].filled(0)
-        self.swir_22 = self.product['S6_radiance_an']['S6_radiance_an'][:].filled(0)
-        self.sza = self._interpolate_array('solar_zenith_tn').filled(0)
-        self.vza = self._interpolate_array('sat_zenith_tn').filled(9999)
-        self.cloud_free = self.product['flags_an']['cloud_an'][:] == 0
-        self.pixel_size = np.tile(np.array(slstr_pixel_size.pixel_size), (self.vza.shape[0], 1)) * 1000000
-        assert self.vza.shape == self.pixel_size.shape
+        self.latitude = self._load_rows('latitude',
+                                        lambda windows: self._read_variable('geodetic_an', 'latitude_an', windows))
+        self.longitude = self._load_rows('longitude',
+                                         lambda windows: self._read_variable('geodetic_an', 'longitude_an', windows))
+        self.swir_16_counts = self._load_packed('swir_16', 'S5_radiance_an')
+        self.swir_22_counts = self._load_packed('swir_22', 'S6_radiance_an')
+        self.cloud_free = self._load_rows('cloud_free',
+                                          lambda windows: self._read_variable('flags_an', 'cloud_an', windows) == 0)
+        self.pixel_size = self._broadcast_pixel_size(self.swir_16_counts.shape)
+        assert self.swir_16_counts.shape == self.pixel_size.shape
+
+    def _load_packed(self, name, member) -> np.ndarray:
+        """
+        Loads the packed counts of a variable, without the netCDF4 auto
+        mask and scale, along with its packing attributes.
+
+        Args:
+            name: Name of the array in the cache
+            member: Name of the product member (NetCDF dataset), which is also the variable name
+
+        Returns:
+            The packed counts
+        """
+        self._packing[name] = self._cached(name + '_packing', lambda: self._read_packing(member, member))
+        return self._load_rows(name + '_counts',
+                               lambda windows: self._read_variable(member, member, windows, packed=True))
+
+    def _read_variable(self, member, name, windows=None, packed=False) -> np.ndarray:
+        """
+        Reads a variable of a product member, or only the given row
+        windows of the variable (stacked in order).
+
+        Args:
+            member: Name of the product member (NetCDF dataset)
+            name: Variable name
+            windows: Optional list of (start, stop) row windows
+            packed: If set the packed data is read, without masking and scaling
+
+        Returns:
+            The variable data
+        """
+        with self._io_lock:
+            variable = self.product[member][name]
+            if packed:
+                mask, scale = variable.mask, variable.scale
+                variable.set_auto_maskandscale(False)
+            try:
+                if windows is None:
+                    return variable[:]
+                stack = np.concatenate if packed else np.ma.concatenate
+                return stack([variable[start:stop] for start, stop in windows])
+            finally:
+                if packed:
+                    variable.set_auto_mask(mask)
+                    variable.set_auto_scale(scale)
+
+    def _read_packing(self, member, name) -> np.ndarray:
+        """
+        Reads the CF packing attributes (scale, offset, fill values and
+        valid range) of a variable.
+
+        Args:
+            member: Name of the product member (NetCDF dataset)
+            name: Variable name
+
+        Returns:
+            Single record holding the attributes present
+        """
+        with self._io_lock:
+            variable = self.product[member][name]
+            attributes = [k for k in ['scale_factor', 'add_offset', '_FillValue', 'missing_value',
+                                      'valid_min', 'valid_max', 'valid_range'] if k in variable.ncattrs()]
+            values = [np.asarray(variable.getncattr(k)) for k in attributes]
+        return np.array([tuple(values)], dtype=[(k, v.dtype, v.shape) for k, v in zip(attributes, values)])
+
+    def _swir_16_at(self, lines, samples) -> np.ndarray:
+        return self._as_dtype(_unpack(self.swir_16_counts[lines, samples], self._packing['swir_16']))
+
+    def _swir_22_at(self, lines, samples) -> np.ndarray:
+        """
+        Returns the 2.2 micron SWIR radiances at the given pixels.
+
+        Args:
+            lines: Line indices of the pixels
+            samples: Sample indices of the pixels
+
+        Returns:
+            The SWIR radiance at each pixel (W m-2 sr-1 um-1)
+        """
+        return self._as_dtype(_unpack(self.swir_22_counts[lines, samples], self._packing['swir_22']))
+
+    def _detect_potential_hotspots(self) -> None:
+        """
+        Identifies pixels with raised signal in the SWIR imagery.  The
+        threshold is converted to the packed count domain and applied to
+        the counts, and the few candidate pixels are then unpacked and
+        confirmed against the radiance threshold, so that the flags are
+        identical to thresholding the unpacked radiances.
+
+        Returns:
+            None
+        """
+        counts = self.swir_16_counts
+        lines, samples = np.where(counts > _count_threshold(self.swir_thresh, self._packing['swir_16'], counts.dtype))
+        self.potential_hotspots = np.zeros(counts.shape, dtype=bool)
+        radiances = _unpack(counts[lines, samples], self._packing['swir_16'])
+        self.potential_hotspots[lines, samples] = radiances > self.swir_thresh
+
+    def _scene_rows(self) -> int:
+        if self.product is None:
+            return self.cache.get(self.product_id, 'swir_16_counts').shape[0]
+        return self.product['S5_radiance_an']['S5_radiance_an'].shape[0]
+
+    def _night_possible(self) -> bool:
+        """
+        Screens the product for night time pixels using the tie point
+        solar zenith angles, before any an grid data is read.  A margin is
+        applied so that products are only rejected if no interpolated angle
+        can pass the day/night test.
+
+        Returns:
+            False if the product contains no night time pixels
+        """
+        sza = self._cached('solar_zenith_tn', lambda: self.product['geometry_tn']['solar_zenith_tn'][:])
+        return sza.filled(0).max() >= self.day_night_angle - proc_const.sls_tie_point_sza_margin
 
-    def _interpolate_array(self, target) -> np.array:
+    def _load_angles(self, lines=None, samples=None) -> None:
+        """
+        Loads the solar and viewing zenith angles on the an grid.  If
+        pixel coordinates are given then the angles are only interpolated
+        at those pixels, with all other pixels set to the same fill values
+        used for invalid data (and so failing the night and view angle tests).
+
+        Args:
+            lines: Optional line indices at which to evaluate the angles
+            samples: Optional sample indices at which to evaluate the angles
+
+        Returns:
+            None
+        """
+        if lines is None:
+            self.sza = self._interpolate_array('solar_zenith_tn').filled(0)
+            self.vza = self._interpolate_array('sat_zenith_tn').filled(9999)
+            return
+
+        sza = self._interpolate_array('solar_zenith_tn', lines, samples)
+        vza = self._interpolate_array('sat_zenith_tn', lines, samples)
+        self.sza = np.zeros(self.swir_16_counts.shape, dtype=sza.dtype)
+        self.vza = np.full(self.swir_16_counts.shape, 9999, dtype=vza.dtype)
+        self.sza[lines, samples] = sza.filled(0)
+        self.vza[lines, samples] = vza.filled(9999)
+
+    def _interpolate_array(self, target, lines=None, samples=None) -> np.array:
         """
         Interpolates SLSTR data arrays based on cartesian information
         contained within the sensor product using the RectBivariateSpline
-        approach.
+        approach.  The spline is evaluated over the full an grid unless
+        pixel coordinates are provided, in which case it is only evaluated
+        at those pixels.
 
         Args:
             target: the product to be interpolated
+            lines: Optional line indices at which to evaluate the spline
+            samples: Optional sample indices at which to evaluate the spline
 
         Returns:
-            The interpolated data
+            The interpolated data (2D, or 1D if pixel coordinates are given)
         """
-        sat_zn = self.product['geometry_tn'][target][:]
+        sat_zn = self._cached(target, lambda: self.product['geometry_tn'][target][:])
 
-        tx_x_var = self.product['cartesian_tx']['x_tx'][0, :]
-        tx_y_var = self.product['cartesian_tx']['y_tx'][:, 0]
+        tx_x_var = self._cached('x_tx', lambda: self.product['cartesian_tx']['x_tx'][0, :])
+        tx_y_var = self._cached('y_tx', lambda: self.product['cartesian_tx']['y_tx'][:, 0])
 
-        an_x_var = self.product['cartesian_an']['x_an'][:]
-        an_y_var = self.product['cartesian_an']['y_an'][:]
+        an_x_var, an_y_var = self._an_coordinates()
+        if lines is not None:
+            an_x_var = an_x_var[lines, samples]
+            an_y_var = an_y_var[lines, samples]
 
         spl = RectBivariateSpline(tx_y_var, tx_x_var[::-1], sat_zn[:, ::-1].filled(0))
         interpolated = spl.ev(an_y_var.compressed(),
@@ -455,9 +1351,24 @@ class SLSDetector(BaseDetector):
         interpolated = np.ma.masked_invalid(interpolated, copy=False)
         sat = np.ma.empty(an_y_var.shape, dtype=sat_zn.dtype)
         sat[np.logical_not(np.ma.getmaskarray(an_y_var))] = interpolated
-        sat.mask = an_y_var.mask
+        sat.mask = np.ma.getmaskarray(an_y_var)
         return sat
 
+    def _an_coordinates(self):
+        """
+        Reads the an grid cartesian coordinates of the selected rows,
+        which are shared by all interpolated arrays, once per product (or tile).
+
+        Returns:
+            The an grid x and y cartesian coordinates
+        """
+        if self._an_xy is None:
+            self._an_xy = (self._load_rows('x_an',
+                                           lambda windows: self._read_variable('cartesian_an', 'x_an', windows)),
+                           self._load_rows('y_an',
+                                           lambda windows: self._read_variable('cartesian_an', 'y_an', windows)))
+        return self._an_xy
+
     def _make_view_angle_mask(self):
         """
         Screen SLSTR data based on viewing zenith angle so
@@ -475,7 +1386,11 @@ class SLSDetector(BaseDetector):
         """
         Runs the detector methods on the input data.  If flares_or_sampling
         flag is set then additional processing is performed on fire radiative power
-        and local cloud cover statistics.
+        and local cloud cover statistics, both only being evaluated at the
+        pixels returned by to_dataframe.  Otherwise the solar and viewing zenith
+        angles (and so the night and view angle masks) are only evaluated at the
+        potential hotspot pixels.  Products without any night time pixels are
+        screened out using the tie point angles before the an grid data is read.
 
         Args:
             flares_or_sampling: flag to set processing level
@@ -483,30 +1398,75 @@ class SLSDetector(BaseDetector):
         Returns:
             None
         """
+        if self._prepare(flares_or_sampling):
+            self._process_rows(flares_or_sampling)
+
+    def _prepare(self, flares_or_sampling) -> bool:
+        """
+        Screens the product using the tie point solar geometry.
+
+        Args:
+            flares_or_sampling: flag to set processing level
+
+        Returns:
+            False if the product holds no night time pixels
+        """
+        if not self._night_possible():
+            self._complete_cache_entry()
+            self._end_empty_product()
+            return False
+        return True
+
+    def _process_rows(self, flares_or_sampling) -> None:
+        """
+        Runs the detector on the selected rows of the product.
+
+        Args:
+            flares_or_sampling: flag to set processing level
+
+        Returns:
+            None
+        """
+        self._an_xy = None
         self._load_arrays()
+        self._detect_potential_hotspots()
+
+        # dense angles are only needed for the flares and sampling stage,
+        # otherwise only evaluate them at the SWIR candidate pixels
+        if flares_or_sampling:
+            self._load_angles()
+        else:
+            self._load_angles(*np.where(self.potential_hotspots))
+        self._complete_cache_entry()
         self._make_night_mask()
         self._make_view_angle_mask()
-        self._detect_potential_hotspots()
         self.hotspots = self.potential_hotspots & self.night_mask & self.vza_mask
 
         if flares_or_sampling:
-            self._compute_frp()
             self.cloudy = ~self.potential_hotspots & ~self.cloud_free & self.night_mask & self.vza_mask
-            self._compute_local_cloudiness()
+        self._apply_dtype()
+
+        self._pointwise['swir_16'] = self._swir_16_at
+        self._pointwise['swir_22'] = self._swir_22_at
+        if flares_or_sampling:
+            self._pointwise['frp'] = self._frp_at
+            self._pointwise['local_cloudiness'] = self._local_cloudiness_at
 
     def to_dataframe(self,
                      keys=None,
                      sampling=False,
-                     joining_df=None) -> pd.DataFrame:
+                     joining_df=None,
+                     persistent_index=None) -> pd.DataFrame:
         """
         Used to return a dataframe containing all needed information
         on the hotspots detected during the run_detector call.  The information
         returned is dependent on the keys provided, and if needed can be screened
-        using the joining_df keyword arg.
+        using the joining_df or persistent_index keyword args.
         Args:
             keys: The data required in the dataframe
             sampling: Flag to determine if hotspot sampling is being evaluated
             joining_df: An optional  joining dataframe that can be used to reduce the hotspots.
+            persistent_index: An optional grid cell index that can be used to reduce the hotspots.
 
         Returns:
             A dataframe containing the requested and possibly reduced data.
@@ -514,4 +1474,5 @@ class SLSDetector(BaseDetector):
         """
         if not('latitude' in keys and 'longitude' in keys):
             raise KeyError('At a minimum, latitude and longitude are required')
-        return self._build_dataframe(keys, sampling=sampling, joining_df=joining_df)
+        return self._build_dataframe(keys, sampling=sampling, joining_df=joining_df,
+                                     persistent_index=persistent_index)
@@ -0,0 +1,52 @@
+'''
+Encodes locations onto the global 1-arcminute grid used for aggregation.
+Each grid cell is identified by a single packed int64 cell id, which
+is used as the key for all joins, sorts and groupbys in the processing
+chain.  This is an approximate representation and is used solely for
+aggregation purposes (i.e. cannot be used for visualisation).
+'''
+import numpy as np
+
+n_rows = 180 * 60 + 1  # latitude arcminutes from -90 to 90 degrees
+n_cols = 360 * 60 + 1  # longitude arcminutes from -180 to 180 degrees
+n_cells = n_rows * n_cols
+
+invalid_cell = -1
+
+
+def encode(latitude, longitude) -> np.ndarray:
+    """
+    Rounds locations to the nearest arcminute and packs the
+    latitude and longitude arcminutes into a single cell id.
+
+    Args:
+        latitude: Latitudes in degrees
+        longitude: Longitudes in degrees
+
+    Returns:
+        int64 cell ids, set to invalid_cell for invalid locations
+    """
+    lat_arcmin = np.rint(np.asarray(latitude, dtype=np.float64) * 60)
+    lon_arcmin = np.rint(np.asarray(longitude, dtype=np.float64) * 60)
+    valid = (np.abs(lat_arcmin) <= (n_rows - 1) // 2) & (np.abs(lon_arcmin) <= (n_cols - 1) // 2)
+    cells = (lat_arcmin + (n_rows - 1) // 2) * n_cols + (lon_arcmin + (n_cols - 1) // 2)
+    return np.where(valid, cells, invalid_cell).astype(np.int64)
+
+
+def decode(cells):
+    """
+    Unpacks cell ids to the locations of the cell centres.
+
+    Args:
+        cells: int64 cell ids
+
+    Returns:
+        The latitude and longitude of the cell centres in degrees
+        (NaN for invalid cells)
+    """
+    cells = np.asarray(cells, dtype=np.int64)
+    rows, cols = np.divmod(cells, n_cols)
+    valid = (cells >= 0) & (cells < n_cells)
+    latitude = np.where(valid, (rows - (n_rows - 1) // 2) / 60, np.nan)
+    longitude = np.where(valid, (cols - (n_cols - 1) // 2) / 60, np.nan)
+    return latitude, longitude
@@ -0,0 +1,100 @@
+'''
+A compact membership index over the global 1-arcminute grid used to
+record the persistent flare locations.  Each grid cell is represented
+by a single bit, so the index for the whole globe is ~29 MB and can be
+loaded zero-copy as a memory map.  Grid cells are given by the packed
+cell ids from src.ggf.gridcells.
+'''
+import numpy as np
+
+from src.ggf import gridcells
+
+
+def _bit_positions(cells):
+    """
+    Finds the position in the index of each grid cell.
+
+    Args:
+        cells: Packed grid cell ids
+
+    Returns:
+        The bit position of each grid cell and a flag indicating if
+        the grid cell falls within the global grid
+    """
+    cells = np.asarray(cells, dtype=np.int64)
+    valid = (cells >= 0) & (cells < gridcells.n_cells)
+    return np.where(valid, cells, 0), valid
+
+
+def build(cells) -> np.ndarray:
+    """
+    Builds the index from a set of grid cells.
+
+    Args:
+        cells: Packed grid cell ids
+
+    Returns:
+        Bit packed index over the global arcminute grid
+    """
+    index = np.zeros((gridcells.n_cells + 7) // 8, dtype=np.uint8)
+    positions, valid = _bit_positions(cells)
+    positions = positions[valid]
+    np.bitwise_or.at(index, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+    return index
+
+
+def union(*indexes) -> np.ndarray:
+    """
+    Combines several indexes so that a grid cell is contained
+    if it is contained in any of them.
+
+    Args:
+        indexes: Indexes to combine
+
+    Returns:
+        The combined index
+    """
+    return np.bitwise_or.reduce(indexes)
+
+
+def contains(index, cells) -> np.ndarray:
+    """
+    Tests grid cell membership of the index in a single vectorised lookup.
+
+    Args:
+        index: Bit packed index
+        cells: Packed grid cell ids
+
+    Returns:
+        Boolean array flagging grid cells contained in the index
+    """
+    positions, valid = _bit_positions(cells)
+    return valid & ((index[positions >> 3] >> (positions & 7)) & 1).astype(bool)
+
+
+def save(index, path) -> None:
+    """
+    Writes the index to disk in .npy format.
+
+    Args:
+        index: Bit packed index
+        path: Output filepath
+
+    Returns:
+        None
+    """
+    np.save(path, index)
+
+
+def load(path) -> np.ndarray:
+    """
+    Loads an index from disk as a read only memory map, so
+    that only the pages that are looked up are read.
+
+    Args:
+        path: Filepath of the index
+
+    Returns:
+        Bit packed index
+    """
+    return np.load(path, mmap_mode='r')
@@ -0,0 +1,201 @@
+'''
+A size capped, least recently used cache of the preprocessed arrays
+used by the detectors, so that repeated processing of a product (e.g.
+the hotspots then the flares stage) does not re-read and decode the
+raw product.  Each product is stored in its own directory, keyed by
+product id, holding one .npy file per array (loaded as read only memory
+maps) and a metadata file that is written last to mark the entry complete.
+'''
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class ProductCache(object):
+
+    def __init__(self, root, max_bytes):
+        """
+        Args:
+            root: Directory holding the cache
+            max_bytes: Maximum total size of the cache in bytes
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, product_id, name=''):
+        return os.path.join(self.root, product_id, name)
+
+    def _write(self, path, write):
+        """
+        Writes a file atomically, so that concurrent readers never
+        see a partially written file.
+        """
+        (fd, temp_file) = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_file, path)
+
+    def contains(self, product_id) -> bool:
+        """
+        Checks if a complete entry is held for the product.
+
+        Args:
+            product_id: Product identifier
+
+        Returns:
+            True if the product is cached
+        """
+        return os.path.isfile(self._path(product_id, 'meta.json'))
+
+    def get(self, product_id, name):
+        """
+        Loads a cached array as a read only memory map.
+
+        Args:
+            product_id: Product identifier
+            name: Array name
+
+        Returns:
+            The array (masked if a mask was stored) or None if not cached
+        """
+        path = self._path(product_id, name + '.npy')
+        if not os.path.isfile(path):
+            return None
+        array = np.load(path, mmap_mode='r')
+        mask_path = self._path(product_id, name + '_mask.npy')
+        if os.path.isfile(mask_path):
+            array = np.ma.array(array, mask=np.load(mask_path, mmap_mode='r'))
+        return array
+
+    def put(self, product_id, name, array) -> None:
+        """
+        Stores an array for the product.  Masks of masked arrays are
+        stored alongside the data.
+
+        Args:
+            product_id: Product identifier
+            name: Array name
+            array: Array to store
+
+        Returns:
+            None
+        """
+        os.makedirs(self._path(product_id), exist_ok=True)
+        if np.ma.isMaskedArray(array):
+            self._write(self._path(product_id, name + '_mask.npy'),
+                        lambda f: np.save(f, np.ma.getmaskarray(array)))
+            array = array.data
+        self._write(self._path(product_id, name + '.npy'), lambda f: np.save(f, np.asarray(array)))
+
+    def put_rows(self, product_id, name, n_rows, read_rows, block_rows=1024) -> None:
+        """
+        Stores an array read in blocks of rows, writing each block to a
+        memory mapped file so that the full array is never held in memory.
+        Masks of masked arrays are stored alongside the data.
+
+        Args:
+            product_id: Product identifier
+            name: Array name
+            n_rows: Number of rows in the array
+            read_rows: Function returning the rows start to stop of the array
+            block_rows: Number of rows read at once
+
+        Returns:
+            None
+        """
+        os.makedirs(self._path(product_id), exist_ok=True)
+        temp_files = {}
+        arrays = {}
+        try:
+            for start in range(0, n_rows, block_rows):
+                stop = min(start + block_rows, n_rows)
+                block = read_rows(start, stop)
+                if not arrays:
+                    shape = (n_rows,) + block.shape[1:]
+                    if np.ma.isMaskedArray(block):
+                        temp_files['_mask'], arrays['_mask'] = self._open_memmap(product_id, np.bool_, shape)
+                    temp_files[''], arrays[''] = self._open_memmap(product_id, block.dtype, shape)
+                if '_mask' in arrays:
+                    arrays['_mask'][start:stop] = np.ma.getmaskarray(block)
+                arrays[''][start:stop] = np.ma.getdata(block)
+            for array in arrays.values():
+                array.flush()
+            arrays.clear()
+
+            # the data is moved into place last, as get only checks for the data
+            for suffix, temp_file in temp_files.items():
+                os.replace(temp_file, self._path(product_id, name + suffix + '.npy'))
+        finally:
+            arrays.clear()
+            for temp_file in temp_files.values():
+                if os.path.isfile(temp_file):
+                    os.remove(temp_file)
+
+    def _open_memmap(self, product_id, dtype, shape):
+        (fd, temp_file) = tempfile.mkstemp(dir=self._path(product_id))
+        os.close(fd)
+        return temp_file, np.lib.format.open_memmap(temp_file, mode='w+', dtype=dtype, shape=shape)
+
+    def get_meta(self, product_id):
+        """
+        Loads the product metadata, marking the entry as recently used.
+
+        Args:
+            product_id: Product identifier
+
+        Returns:
+            Dictionary of metadata or None if the product is not cached
+        """
+        if not self.contains(product_id):
+            return None
+        os.utime(self._path(product_id))
+        with open(self._path(product_id, 'meta.json')) as f:
+            return json.load(f)
+
+    def put_meta(self, product_id, meta) -> None:
+        """
+        Stores the product metadata, completing the entry, and then
+        evicts the least recently used products if the cache is full.
+
+        Args:
+            product_id: Product identifier
+            meta: JSON serialisable dictionary of metadata
+
+        Returns:
+            None
+        """
+        os.makedirs(self._path(product_id), exist_ok=True)
+        self._write(self._path(product_id, 'meta.json'), lambda f: f.write(json.dumps(meta).encode()))
+        os.utime(self._path(product_id))
+        self.evict(keep=product_id)
+
+    def evict(self, keep=None) -> None:
+        """
+        Removes the least recently used products until the cache
+        is within its size limit.
+
+        Args:
+            keep: Product identifier that must not be evicted
+
+        Returns:
+            None
+        """
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, product_id in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if product_id == keep:
+                continue
+            shutil.rmtree(self._path(product_id), ignore_errors=True)
+            total -= size
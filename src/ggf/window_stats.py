@@ -0,0 +1,196 @@
+'''
+Windowed image statistics computed from cumulative sums (summed
+area tables).  The cost per pixel is constant regardless of window
+size, and all statistics use constant (zero) padding at the image
+edges, matching scipy.ndimage.convolve(..., mode='constant', cval=0)
+with a square kernel of ones.  The point_* variants compute the
+same statistics at a set of pixels only, reading each window directly.
+'''
+import numpy as np
+
+
+def _window_bounds(n, size):
+    """
+    Computes the clipped start and stop indices of a window of the
+    given size centred on each of n positions along an axis.
+
+    Args:
+        n: Number of positions along the axis
+        size: Window size (odd sizes are centred on the pixel)
+
+    Returns:
+        The window start and stop indices for each position
+    """
+    start = np.arange(n) - size // 2
+    return np.clip(start, 0, n), np.clip(start + size, 0, n)
+
+
+def _accumulator(array):
+    """
+    Selects the accumulation dtype for windowed sums, so that
+    float32 images are summed at double precision.
+
+    Args:
+        array: Input array
+
+    Returns:
+        int64 for boolean and integer arrays, otherwise float64
+    """
+    return np.float64 if np.issubdtype(array.dtype, np.floating) else np.int64
+
+
+def _running_sum(array, size, axis):
+    """
+    Sums a window of the given size along a single axis using
+    the difference of a cumulative sum.
+
+    Args:
+        array: Input 2D array
+        size: Window size
+        axis: Axis along which the window is applied
+
+    Returns:
+        The windowed sums along the axis
+    """
+    n = array.shape[axis]
+    cumulative = np.cumsum(array, axis=axis, dtype=_accumulator(array))
+    cumulative = np.insert(cumulative, 0, 0, axis=axis)
+    start, stop = _window_bounds(n, size)
+    return np.take(cumulative, stop, axis=axis) - np.take(cumulative, start, axis=axis)
+
+
+def window_sum(array, size) -> np.ndarray:
+    """
+    Computes the sum over a square window centred on each pixel.
+    Boolean inputs are summed as integers (i.e. give counts).
+
+    Args:
+        array: Input 2D array
+        size: Window size in pixels
+
+    Returns:
+        Array of windowed sums with the same shape as the input
+    """
+    return _running_sum(_running_sum(array, size, 0), size, 1)
+
+
+def window_count(shape, size) -> np.ndarray:
+    """
+    Computes the number of pixels falling inside the image
+    for a square window centred on each pixel.
+
+    Args:
+        shape: Shape of the 2D image
+        size: Window size in pixels
+
+    Returns:
+        Array of in-image pixel counts for each window
+    """
+    row_start, row_stop = _window_bounds(shape[0], size)
+    col_start, col_stop = _window_bounds(shape[1], size)
+    return np.outer(row_stop - row_start, col_stop - col_start)
+
+
+def window_mean(array, size) -> np.ndarray:
+    """
+    Computes the mean over a square window centred on each
+    pixel, using only the pixels that fall inside the image.
+
+    Args:
+        array: Input 2D array
+        size: Window size in pixels
+
+    Returns:
+        Array of windowed means with the same shape as the input
+    """
+    return window_sum(array, size) / window_count(array.shape, size)
+
+
+def point_windows(array, size, lines, samples) -> np.ndarray:
+    """
+    Reads the square window centred on each of the given pixels
+    directly from the image.  Window elements falling outside the
+    image are set to zero (False for boolean inputs).
+
+    Args:
+        array: Input 2D array
+        size: Window size in pixels
+        lines: Line indices of the window centres
+        samples: Sample indices of the window centres
+
+    Returns:
+        Array of shape (n_pixels, size, size) holding the windows
+    """
+    offsets = np.arange(size) - size // 2
+    rows = np.asarray(lines)[:, None] + offsets
+    cols = np.asarray(samples)[:, None] + offsets
+    inside = (((rows >= 0) & (rows < array.shape[0]))[:, :, None] &
+              ((cols >= 0) & (cols < array.shape[1]))[:, None, :])
+    windows = array[np.clip(rows, 0, array.shape[0] - 1)[:, :, None],
+                    np.clip(cols, 0, array.shape[1] - 1)[:, None, :]]
+    return np.where(inside, windows, np.zeros(1, dtype=array.dtype))
+
+
+def point_sum(array, size, lines, samples, chunk_size=2 ** 22) -> np.ndarray:
+    """
+    Computes the sum over a square window centred on each of the
+    given pixels, reading only those windows.  Pixels are processed
+    in chunks so that at most chunk_size window elements are held
+    in memory at once.
+
+    Args:
+        array: Input 2D array
+        size: Window size in pixels
+        lines: Line indices of the window centres
+        samples: Sample indices of the window centres
+        chunk_size: Maximum number of window elements per chunk
+
+    Returns:
+        Array of windowed sums for each pixel
+    """
+    lines = np.asarray(lines)
+    samples = np.asarray(samples)
+    step = max(1, chunk_size // size ** 2)
+    sums = []
+    for i in range(0, lines.size, step):
+        windows = point_windows(array, size, lines[i:i + step], samples[i:i + step])
+        sums.append(windows.sum(axis=(1, 2), dtype=_accumulator(array)))
+    if not sums:
+        return np.zeros(0, dtype=_accumulator(array))
+    return np.concatenate(sums)
+
+
+def point_count(shape, size, lines, samples) -> np.ndarray:
+    """
+    Computes the number of pixels falling inside the image for
+    a square window centred on each of the given pixels.
+
+    Args:
+        shape: Shape of the 2D image
+        size: Window size in pixels
+        lines: Line indices of the window centres
+        samples: Sample indices of the window centres
+
+    Returns:
+        Array of in-image pixel counts for each window
+    """
+    row_start, row_stop = _window_bounds(shape[0], size)
+    col_start, col_stop = _window_bounds(shape[1], size)
+    return (row_stop - row_start)[lines] * (col_stop - col_start)[samples]
+
+
+def point_mean(array, size, lines, samples) -> np.ndarray:
+    """
+    Computes the mean over a square window centred on each of
+    the given pixels, using only the pixels inside the image.
+
+    Args:
+        array: Input 2D array
+        size: Window size in pixels
+        lines: Line indices of the window centres
+        samples: Sample indices of the window centres
+
+    Returns:
+        Array of windowed means for each pixel
+    """
+    return point_sum(array, size, lines, samples) / point_count(array.shape, size, lines, samples)
@@ -1,11 +1,18 @@
 import os
 import sys
+import time
+import argparse
 import tempfile
 import subprocess
 import glob
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 import src.config.filepaths as fp
-from src.utils import build_outpath
+from src.utils import build_outpath, write_manifest
+
+# largest slurm job array that is submitted at once (slurm MaxArraySize default is 1001)
+max_array_size = 1000
 
 
 def presubmission_checks(file_to_process,
@@ -35,9 +42,160 @@ def submit(script, file_to_process, sensor):
         print('Subprocess failed with error:', str(e))
 
 
+def submit_array(script, filepaths, sensor, products_per_task):
+    """
+    Submits all products as slurm job arrays, rather than one job per
+    product.  The products are written to a manifest and each array task
+    processes a chunk of products_per_task products in a single interpreter.
+
+    Args:
+        script: Processing script to run
+        filepaths: List of products to process
+        sensor: Sensor code string
+        products_per_task: Number of products processed by each array task
+
+    Returns:
+        None
+    """
+    if not filepaths:
+        return
+    manifest = write_manifest(filepaths, fp.script_temp)
+    n_tasks = (len(filepaths) + products_per_task - 1) // products_per_task
+
+    (gd, temp_file) = tempfile.mkstemp('.sh', 'ggf.', fp.script_temp, True)
+    g = os.fdopen(gd, "w")
+    g.write('#!/bin/bash\n')
+    g.write('export PYTHONPATH=$PYTHONPATH:/home/users/dnfisher/projects/kcl-globalgasflaring/\n')
+    g.write(" ".join([os.path.join(fp.script_temp, 'batch', script), '--manifest', manifest,
+                      sensor, str(products_per_task), '$1\n']))
+    g.close()
+    os.chmod(temp_file, 0o755)
+
+    slurm_logs = []
+    if fp.slurm_info:
+        slurm_logs += ['-o', fp.slurm_info]
+    if fp.slurm_error:
+        slurm_logs += ['-e', fp.slurm_error]
+    for task_offset in range(0, n_tasks, max_array_size):
+        array = '--array=0-{}'.format(min(max_array_size, n_tasks - task_offset) - 1)
+        cmd = ['sbatch', '-p', 'short-serial', array] + slurm_logs + [temp_file, str(task_offset)]
+        try:
+            subprocess.call(cmd)
+        except Exception as e:
+            print('Subprocess failed with error:', str(e))
+
+
+class Executor(ABC):
+    """
+    Interface for the backends that run a processing script
+    over a set of products.
+    """
+
+    @abstractmethod
+    def run(self, script, filepaths, sensor):
+        raise NotImplementedError("Must override run")
+
+
+class SlurmExecutor(Executor):
+
+    def __init__(self, products_per_task=None):
+        """
+        Hands the products to slurm, either as one job per product
+        or as job arrays with several products per task.
+
+        Args:
+            products_per_task: Number of products processed by each array task
+                (one job per product if None)
+        """
+        self.products_per_task = products_per_task
+
+    def run(self, script, filepaths, sensor) -> None:
+        if self.products_per_task is not None:
+            submit_array(script, filepaths, sensor, self.products_per_task)
+            return
+        for f in filepaths:
+            submit(script, f, sensor)
+
+
+class LocalExecutor(Executor):
+
+    def __init__(self, processes=None, timeout=None):
+        """
+        Runs the products on the local machine, with at most processes
+        products running at once.  Each product runs in its own
+        interpreter so that it can be killed if it exceeds the timeout.
+
+        Args:
+            processes: Maximum number of concurrent products (all cores if None)
+            timeout: Per product time limit in seconds (no limit if None)
+        """
+        self.processes = processes or os.cpu_count()
+        self.timeout = timeout
+
+    def _run_product(self, script, file_to_process, sensor):
+        """
+        Runs the processing script on a single product.
+
+        Returns:
+            Tuple of the product, its status ('ok', 'failed' or 'timeout'),
+            the elapsed time and any error output
+        """
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]))
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), script),
+               file_to_process, sensor]
+
+        start = time.time()
+        try:
+            result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    timeout=self.timeout, universal_newlines=True)
+        except subprocess.TimeoutExpired:
+            return file_to_process, 'timeout', time.time() - start, ''
+        status = 'ok' if result.returncode == 0 else 'failed'
+        return file_to_process, status, time.time() - start, result.stderr
+
+    def run(self, script, filepaths, sensor) -> dict:
+        """
+        Processes the products and prints a summary of the results.
+
+        Args:
+            script: Processing script to run
+            filepaths: List of products to process
+            sensor: Sensor code string
+
+        Returns:
+            Summary of the run, holding the per product results
+        """
+        start = time.time()
+        with ThreadPoolExecutor(self.processes) as pool:
+            results = list(pool.map(lambda f: self._run_product(script, f, sensor), filepaths))
+        elapsed = time.time() - start
+
+        summary = {status: sum(r[1] == status for r in results) for status in ['ok', 'failed', 'timeout']}
+        summary['elapsed'] = elapsed
+        summary['results'] = results
+
+        print('Processed {} products in {:.1f} s ({:.1f} products/hour) with {} processes'.format(
+            len(results), elapsed, 3600 * len(results) / elapsed if elapsed else 0, self.processes))
+        print('ok: {ok}, failed: {failed}, timed out: {timeout}'.format(**summary))
+        for file_to_process, status, _, error in results:
+            if status != 'ok':
+                print(status, file_to_process, error.strip().split('\n')[-1] if error else '')
+        return summary
+
+
 def main():
-    script = sys.argv[1]
-    sensor = sys.argv[2]
+    parser = argparse.ArgumentParser(description='Run a processing stage over all products of a sensor')
+    parser.add_argument('script', help="processing stage, one of 'hotspots' or 'flares'")
+    parser.add_argument('sensor', help="sensor, one of 'ats', 'at2', 'at1' or 'sls'")
+    parser.add_argument('products_per_task', nargs='?', type=int,
+                        help='submit slurm job arrays with this many products per task')
+    parser.add_argument('--local', type=int, nargs='?', const=0, metavar='PROCESSES',
+                        help='run on the local machine with this many concurrent products (default all cores)')
+    parser.add_argument('--timeout', type=float, help='per product time limit in seconds when running locally')
+    args = parser.parse_args()
+    script = args.script
+    sensor = args.sensor
 
     # check args
     if sensor not in ['ats', 'at2', 'at1', 'sls']:
@@ -51,12 +209,15 @@ def main():
     # append filetype to script
     script += '.py'
 
+    if args.local is not None:
+        executor = LocalExecutor(processes=args.local, timeout=args.timeout)
+    else:
+        executor = SlurmExecutor(products_per_task=args.products_per_task)
+
     # TODO reverse filepath order so that most recent files are processed first
     filepaths = glob.glob(fp.products[sensor], recursive=True)
-    for f in filepaths:
-        if not presubmission_checks(f, sensor, proc_flags):
-            continue
-        submit(script, f, sensor)
+    filepaths = [f for f in filepaths if presubmission_checks(f, sensor, proc_flags)]
+    executor.run(script, filepaths, sensor)
 
 
 if __name__ == "__main__":
@@ -2,41 +2,48 @@
 
 import os
 import sys
-import epr
-import pandas as pd
 import numpy as np
+from functools import lru_cache
 
-from src.ggf.detectors import ATXDetector, SLSDetector
+from src.ggf import persistent_index
 import src.utils as utils
+import src.config.constants as proc_const
 import src.config.filepaths as fp
 
 
-def merge_hotspot_dataframes(atx_persistent_df, sls_persistent_df):
-    atx_persistent_df['sensor'] = 1
-    sls_persistent_df['sensor'] = -1
-    appended_df = atx_persistent_df.append(sls_persistent_df)
-    hotspot_df = appended_df.groupby(['lats_arcmin', 'lons_arcmin'], as_index=False).agg({'sensor': np.sum})
+def aggregate(df, aggregator):
+    return df.groupby('cell', as_index=False).agg(aggregator)
 
-    # the below information is not used here but we can use this
-    # idea to update the sensor information during the post processing
-    hotspot_df.sensor.loc[hotspot_df.sensor == 1] = 'atx'
-    hotspot_df.sensor.loc[hotspot_df.sensor == -1] = 'sls'
-    hotspot_df.sensor.loc[hotspot_df.sensor == 0] = 'both'
-    return hotspot_df
 
+@lru_cache(maxsize=None)
+def load_persistent_index(sensor):
+    """
+    Loads the persistent flare location index for the sensor, merging
+    the ATSR and SLSTR locations for SLSTR.  The index is cached so
+    that it is only loaded once per interpreter.
 
-def aggregate(df, aggregator):
-    return df.groupby(['grid_y', 'grid_x'], as_index=False).agg(aggregator)
+    Args:
+        sensor: Sensor code string
 
+    Returns:
+        Persistent flare location index
+    """
+    atx_persistent_fp = os.path.join(fp.output_l3,
+                                     'all_sensors',
+                                     'all_flare_locations_atx.npy')
+    if sensor != 'sls':
+        return persistent_index.load(atx_persistent_fp)
 
-def main():
-    file_to_process = sys.argv[1]
-    sensor = sys.argv[2]
+    sls_persistent_fp = os.path.join(fp.output_l3,
+                                     'all_sensors',
+                                     'all_flare_locations_sls.npy')
+    return persistent_index.union(persistent_index.load(atx_persistent_fp),
+                                  persistent_index.load(sls_persistent_fp))
 
-    if sensor != 'sls':
-        product = epr.Product(file_to_process)
-        HotspotDetector = ATXDetector(product)
 
+def detect(file_to_process, sensor, data):
+    HotspotDetector = utils.open_detector(file_to_process, sensor, data)
+    if sensor != 'sls':
         flare_keys = ['latitude',
                       'longitude',
                       'local_cloudiness',
@@ -69,15 +76,10 @@ def main():
                                'day': 'first',
                                'hhmm': 'first'}
 
-        atx_persistent_fp = os.path.join(fp.output_l3,
-                                         'all_sensors',
-                                         'all_flare_locations_ats.csv')
-        persistent_df = pd.read_csv(atx_persistent_fp)
+        flare_index = load_persistent_index(sensor)
+        run_kwargs = {'persistent_index': flare_index}  # only read the rows holding persistent locations
 
     else:
-        product = utils.extract_zip(file_to_process, fp.slstr_extract_temp)
-        HotspotDetector = SLSDetector(product)
-
         flare_keys = ['latitude',
                       'longitude',
                       'local_cloudiness',
@@ -110,32 +112,49 @@ def main():
                                'hhmm': 'first'
                                }
 
-        # merge persistent dataframes for SLSTR
-        atx_persistent_fp = os.path.join(fp.output_l3,
-                                         'all_sensors',
-                                         'all_flare_locations_atx.csv')
-        atx_persistent_df = pd.read_csv(atx_persistent_fp)
-
-        sls_persistent_fp = os.path.join(fp.output_l3,
-                                         'all_sensors',
-                                         'all_flare_locations_sls.csv')
-        sls_persistent_df = pd.read_csv(sls_persistent_fp)
-
-        persistent_df = merge_hotspot_dataframes(atx_persistent_df,
-                                                 sls_persistent_df)
-    # find persistent hotspots (i.e. flares)
-    HotspotDetector.run_detector(flares_or_sampling=True)
-    flare_df = HotspotDetector.to_dataframe(keys=flare_keys,
-                                            joining_df=persistent_df)
-    aggregated_flare_df = aggregate(flare_df, flare_aggregator)
-    aggregated_flare_df.to_csv(utils.build_outpath(sensor, file_to_process, 'flares'))
+        flare_index = load_persistent_index(sensor)
+        run_kwargs = {}
 
-    # get sampling associated with persistent hotspots
-    sampling_df = HotspotDetector.to_dataframe(keys=sampling_keys,
-                                               joining_df=persistent_df)
-    aggregated_sampling_df = aggregate(sampling_df, sampling_aggregator)
+    # find persistent hotspots (i.e. flares) and the sampling associated with them
+    flare_df, sampling_df = HotspotDetector.run_tiled([{'keys': flare_keys,
+                                                        'persistent_index': flare_index},
+                                                       {'keys': sampling_keys,
+                                                        'sampling': True,
+                                                        'persistent_index': flare_index}],
+                                                      tile_rows=proc_const.detector_tile_rows,
+                                                      flares_or_sampling=True,
+                                                      threads=proc_const.detector_threads,
+                                                      **run_kwargs)
+    return aggregate(flare_df, flare_aggregator), aggregate(sampling_df, sampling_aggregator)
+
+
+def write(file_to_process, sensor, aggregated_dfs):
+    aggregated_flare_df, aggregated_sampling_df = aggregated_dfs
+    aggregated_flare_df.to_csv(utils.build_outpath(sensor, file_to_process, 'flares'))
     aggregated_sampling_df.to_csv(utils.build_outpath(sensor, file_to_process, 'samples'))
 
 
+def process(file_to_process, sensor):
+    write(file_to_process, sensor, detect(file_to_process, sensor, utils.read_product(file_to_process, sensor)))
+
+
+def main():
+    # array task: python flares.py --manifest <manifest> <sensor> <products_per_task> [task_offset]
+    if sys.argv[1] == '--manifest':
+        sensor = sys.argv[3]
+        products_per_task = int(sys.argv[4])
+        task_offset = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+        task_id = int(os.environ['SLURM_ARRAY_TASK_ID']) + task_offset
+        products = utils.read_manifest(sys.argv[2], task_id, products_per_task)
+        sys.exit(1 if utils.pipeline_products(utils.read_product, detect, write, products, sensor) else 0)
+
+    # long running worker: python flares.py --worker <sensor> [product_list]  (stdin if no list is given)
+    if sys.argv[1] == '--worker':
+        products = utils.read_products(sys.argv[3] if len(sys.argv) > 3 else None)
+        sys.exit(1 if utils.pipeline_products(utils.read_product, detect, write, products, sys.argv[2]) else 0)
+
+    process(sys.argv[1], sys.argv[2])
+
+
 if __name__ == "__main__":
     main()
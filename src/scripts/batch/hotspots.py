@@ -1,29 +1,49 @@
 #!/apps/jasmin/jaspy/miniconda_envs/jaspy3.7/m3-4.6.14/envs/jaspy3.7-m3-4.6.14-r20200606/bin/python3
 
+import os
 import sys
-import epr
 
-from src.ggf.detectors import ATXDetector, SLSDetector
+from src.ggf import cell_summaries
 import src.utils as utils
-import src.config.filepaths as fp
+import src.config.constants as proc_const
+
+
+def detect(file_to_process, sensor, data):
+    HotspotDetector = utils.open_detector(file_to_process, sensor, data)
+    keys = ['latitude', 'longitude', 'swir_16']
+    df, = HotspotDetector.run_tiled([{'keys': keys}],
+                                    tile_rows=proc_const.detector_tile_rows,
+                                    threads=proc_const.detector_threads)
+
+    # the hotspot pixels are reduced to one record per grid cell for the orbit
+    orbit = dict(HotspotDetector.datetime_info, sensor=HotspotDetector.sensor)
+    return cell_summaries.summarise(df, orbit)
+
+
+def write(file_to_process, sensor, summary):
+    cell_summaries.save(summary, utils.build_outpath(sensor, file_to_process, 'hotspots'))
+
+
+def process(file_to_process, sensor):
+    write(file_to_process, sensor, detect(file_to_process, sensor, utils.read_product(file_to_process, sensor)))
 
 
 def main():
-    file_to_process = sys.argv[1]
-    sensor = sys.argv[2]
-
-    if sensor != 'sls':
-        product = epr.Product(file_to_process)
-        HotspotDetector = ATXDetector(product)
-        keys = ['latitude', 'longitude']
-    else:
-        product = utils.extract_zip(file_to_process, fp.slstr_extract_temp)
-        HotspotDetector = SLSDetector(product)
-        keys = ['latitude', 'longitude']
-
-    HotspotDetector.run_detector()
-    df = HotspotDetector.to_dataframe(keys=keys)
-    df.to_csv(utils.build_outpath(sensor, file_to_process, 'hotspots'))
+    # array task: python hotspots.py --manifest <manifest> <sensor> <products_per_task> [task_offset]
+    if sys.argv[1] == '--manifest':
+        sensor = sys.argv[3]
+        products_per_task = int(sys.argv[4])
+        task_offset = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+        task_id = int(os.environ['SLURM_ARRAY_TASK_ID']) + task_offset
+        products = utils.read_manifest(sys.argv[2], task_id, products_per_task)
+        sys.exit(1 if utils.pipeline_products(utils.read_product, detect, write, products, sensor) else 0)
+
+    # long running worker: python hotspots.py --worker <sensor> [product_list]  (stdin if no list is given)
+    if sys.argv[1] == '--worker':
+        products = utils.read_products(sys.argv[3] if len(sys.argv) > 3 else None)
+        sys.exit(1 if utils.pipeline_products(utils.read_product, detect, write, products, sys.argv[2]) else 0)
+
+    process(sys.argv[1], sys.argv[2])
 
 
 if __name__ == "__main__":
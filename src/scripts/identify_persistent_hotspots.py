@@ -5,27 +5,9 @@ import pandas as pd
 import numpy as np
 
 import src.config.filepaths as fp
-
-
-def load_csvs(paths, cols=None) -> pd.DataFrame:
-    """
-    Generate a dataframe from a set of CSV files retaining
-    specified columns.
-
-    Args:
-        paths: List of csv files
-        cols: Columns to use (all if None)
-
-    Returns:
-        Pandas dataframe generated from the input CSV files
-    """
-    df_container = []
-    for p in paths:
-        try:
-            df_container.append(pd.read_csv(p, usecols=cols))
-        except pd.errors.EmptyDataError:
-            continue
-    return pd.concat(df_container, ignore_index=True)
+import src.config.constants as proc_const
+from src.ggf import persistent_index
+from src.utils import iter_csvs, iter_summaries
 
 
 def orbits_to_months(df, subset_cols=None) -> pd.DataFrame:
@@ -43,47 +25,113 @@ def orbits_to_months(df, subset_cols=None) -> pd.DataFrame:
 
     """
     if subset_cols is None:
-        subset_cols = ['grid_x', 'grid_y', 'year', 'month']
+        subset_cols = ['cell', 'year', 'month']
     return df.drop_duplicates(subset=subset_cols)
 
 
-def months_to_annual_counts(df):
+def load_monthly_detections(paths, cols=None, chunk_size=1000, reader=iter_csvs) -> pd.DataFrame:
     """
-    Given a dataframe containing monthly detections returns
-    an aggregated dataframe providing the total number of hotspot
-    detections counted in a given gridcell over an approximate
-    twelve month period.
+    Streams a set of orbit level files into the monthly product
+    (see orbits_to_months).  Files are read in parallel and each is
+    reduced to its unique grid cell months as it is read.  Each chunk
+    of files is then merged into the running result, so that memory
+    use is bounded by the number of distinct grid cell months rather
+    than the number of detections.
 
     Args:
-        df: Monthly detection dataframe
+        paths: List of orbit level files
+        cols: Columns to use (all if None)
+        chunk_size: Number of files reduced before merging into the result
+        reader: Function iterating over the files (iter_csvs or iter_summaries)
 
     Returns:
-        Aggregated dataframe of annum hotspot counts
+        Dataframe of grid cells with at least one hotspot
+        detection in any given month.
+    """
+    monthly_df = None
+    df_container = []
+    for df in reader(paths, cols=cols, dtypes=proc_const.csv_dtypes, reduce=orbits_to_months):
+        df_container.append(df)
+        if len(df_container) == chunk_size:
+            monthly_df = _merge_months(monthly_df, df_container)
+            df_container = []
+    return _merge_months(monthly_df, df_container)
+
+
+def _merge_months(monthly_df, df_container) -> pd.DataFrame:
+    """
+    Merges a chunk of monthly dataframes into the running result.
 
+    Args:
+        monthly_df: Running monthly dataframe (or None)
+        df_container: List of monthly dataframes to merge
+
+    Returns:
+        The merged monthly dataframe
     """
-    df['day'] = 1  # arbitrary day column to allow use of pd.to_datetime
-    df['dt'] = pd.to_datetime(df[['year', 'month', 'day']])
-    df['counter'] = 1
+    if monthly_df is not None:
+        df_container = [monthly_df] + df_container
+    if not df_container:
+        return monthly_df
+    return orbits_to_months(pd.concat(df_container, ignore_index=True))
 
-    annual_count_df = None
 
-    # iterate over unique datetimes
-    for start_dt in sorted(df['dt'].unique()):
+def months_to_annual_counts(df, chunk_size=100000) -> pd.DataFrame:
+    """
+    Given a dataframe containing monthly detections returns
+    an aggregated dataframe providing the total number of hotspot
+    detections counted in a given gridcell over a twelve month
+    period, for each twelve month period starting on a month
+    with detections.
 
-        # create approximate 12 month period (~365 days)
-        stop_dt = start_dt + pd.to_timedelta(365, unit='days')
+    The counts for all periods are found in one pass using the
+    cumulative sum along the months of a cell by month presence
+    matrix, which is evaluated for blocks of cells to bound memory.
 
-        # subset and aggregate
-        sub_df = df[start_dt <= df.dt < stop_dt]
-        sub_df = sub_df.groupby(['grid_x', 'grid_y']).agg({'counter': np.sum})
+    Args:
+        df: Monthly detection dataframe
+        chunk_size: Number of grid cells evaluated at once
 
-        # append
-        if annual_count_df is None:
-            annual_count_df = sub_df
-        else:
-            annual_count_df = annual_count_df.append(sub_df, ignore_index=True)
+    Returns:
+        Aggregated dataframe of annum hotspot counts
 
-    return annual_count_df
+    """
+    months = df['year'].values.astype(np.int64) * 12 + df['month'].values.astype(np.int64) - 1
+    cells, cell_index = np.unique(df['cell'].values, return_inverse=True)
+
+    # periods start on each month with detections
+    starts = np.unique(months) - months.min()
+    n_months = starts[-1] + 1
+    months = months - months.min()
+
+    # sort by cell so each block of cells is a contiguous slice
+    order = np.argsort(cell_index, kind='stable')
+    cell_index = cell_index[order]
+    months = months[order]
+
+    period_container = []
+    cell_container = []
+    count_container = []
+    for first_cell in range(0, cells.size, chunk_size):
+        n_cells = min(chunk_size, cells.size - first_cell)
+        lo, hi = np.searchsorted(cell_index, [first_cell, first_cell + n_cells])
+
+        # padded so that periods running past the last month are truncated
+        presence = np.zeros((n_cells, n_months + 12), dtype=np.int16)
+        presence[cell_index[lo:hi] - first_cell, months[lo:hi]] = 1
+        cumulative = np.zeros((n_cells, n_months + 13), dtype=np.int16)
+        np.cumsum(presence, axis=1, out=cumulative[:, 1:])
+        counts = cumulative[:, starts + 12] - cumulative[:, starts]
+
+        period, cell = np.nonzero(counts.T)
+        period_container.append(period)
+        cell_container.append(cell + first_cell)
+        count_container.append(counts[cell, period])
+
+    period = np.concatenate(period_container)
+    order = np.argsort(period, kind='stable')
+    return pd.DataFrame({'cell': cells[np.concatenate(cell_container)[order]],
+                         'counter': np.concatenate(count_container)[order]})
 
 
 def main():
@@ -95,19 +143,23 @@ def main():
     # set paths and target columns
     if sensor == 'atx':
         paths = glob.glob(fp.atx_hotspots)
-        cols = ['grid_x', 'grid_y', 'year', 'month']
+        cols = ['cell', 'year', 'month']
         min_count = 4
     else:
         paths = glob.glob(fp.sls_hotspots)
-        cols = ['grid_x', 'grid_y', 'year', 'month']
+        cols = ['cell', 'year', 'month']
         min_count = 2
 
-    df = load_csvs(paths, cols=cols)
-    df = orbits_to_months(df)
+    # the hotspots stage outputs one grid cell summary file per orbit
+    df = load_monthly_detections(paths, cols=cols, reader=iter_summaries)
     df = months_to_annual_counts(df)
     df = df[df.counter > min_count]
     df.to_csv(os.path.join(fp.output_l3, sensor + f"all_flare_locations_{sensor}.csv"))
 
+    # membership index used by the flares stage in place of the csv join
+    index = persistent_index.build(df.cell.values)
+    persistent_index.save(index, os.path.join(fp.output_l3, 'all_sensors', f"all_flare_locations_{sensor}.npy"))
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+import numpy as np
+
+from src.ggf import cell_summaries
+
+orbit = {'year': '2008', 'month': '06', 'day': '15', 'hhmm': '1010', 'sensor': 'ats'}
+
+
+class MyTestCase(unittest.TestCase):
+
+    def test_summarise(self):
+        rng = np.random.RandomState(0)
+        df = pd.DataFrame({'cell': rng.randint(0, 20, 500) * 1000,
+                           'swir_16': rng.rand(500).astype(np.float32)})
+
+        target = df.groupby('cell').swir_16.agg(['size', 'max', 'mean'])
+        result = cell_summaries.summarise(df, orbit)
+
+        self.assertEqual(True, (target.index.values == result['cell']).all())
+        self.assertEqual(True, (target['size'].values == result['pixel_count']).all())
+        self.assertEqual(True, (target['max'].values == result['swir_16_max']).all())
+        self.assertEqual(True, np.allclose(target['mean'].values, result['swir_16_mean']))
+        self.assertEqual(2008, result['year'])
+
+    def test_round_trip(self):
+        df = pd.DataFrame({'cell': [5, 3, 5], 'swir_16': [1.0, 2.0, 3.0]})
+        with tempfile.TemporaryDirectory() as path_to_temp:
+            path = os.path.join(path_to_temp, 'orbit_hotspots.npz')
+            cell_summaries.save(cell_summaries.summarise(df, orbit), path)
+            result = cell_summaries.load(path)
+            empty = os.path.join(path_to_temp, 'empty_hotspots.npz')
+            cell_summaries.save(cell_summaries.summarise(df.iloc[:0], orbit), empty)
+            empty_result = cell_summaries.load(empty, cols=['cell', 'year', 'month'])
+
+        self.assertEqual([3, 5], result.cell.tolist())
+        self.assertEqual([1, 2], result.pixel_count.tolist())
+        self.assertEqual([2.0, 3.0], result.swir_16_max.tolist())
+        self.assertEqual([2.0, 2.0], result.swir_16_mean.tolist())
+        self.assertEqual([6, 6], result.month.tolist())
+        self.assertEqual(['ats', 'ats'], result.sensor.tolist())
+        self.assertEqual(0, len(empty_result))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@ import glob
 import epr
 
 import src.utils as utils
-from src.ggf.detectors import SLSDetector, ATXDetector
+from src.ggf.detectors import SLSDetector, ATXDetector, _row_windows, _windows_from_rows, _unpack, _count_threshold
 
 
 class MyTestCase(unittest.TestCase):
@@ -23,7 +23,7 @@ class MyTestCase(unittest.TestCase):
 
         product = utils.extract_zip(path_to_data, path_to_temp)
         HotspotDetector = SLSDetector(product)
-        HotspotDetector.run_detector()
+        HotspotDetector.run_detector(flares_or_sampling=True)
 
         self.assertEqual(True, (target == HotspotDetector.sza).all())
 
@@ -35,7 +35,7 @@ class MyTestCase(unittest.TestCase):
 
         product = utils.extract_zip(path_to_data, path_to_temp)
         HotspotDetector = SLSDetector(product)
-        HotspotDetector.run_detector()
+        HotspotDetector.run_detector(flares_or_sampling=True)
 
         self.assertEqual(True, (target == HotspotDetector.night_mask).all())
 
@@ -50,7 +50,10 @@ class MyTestCase(unittest.TestCase):
         HotspotDetector = ATXDetector(product)
         HotspotDetector.run_detector()
 
-        self.assertAlmostEqual(target_mean, np.mean(HotspotDetector.night_mask))
+        # only rows containing night time pixels are read
+        night_mask = np.zeros(target.shape, dtype=bool)
+        night_mask[HotspotDetector.rows] = HotspotDetector.night_mask
+        self.assertAlmostEqual(target_mean, np.mean(night_mask))
 
     def test_vza_interpolation(self):
         path_to_data = glob.glob("../../data/test_data/S3A*.zip")[0]
@@ -61,7 +64,7 @@ class MyTestCase(unittest.TestCase):
 
         product = utils.extract_zip(path_to_data, path_to_temp)
         HotspotDetector = SLSDetector(product)
-        HotspotDetector.run_detector()
+        HotspotDetector.run_detector(flares_or_sampling=True)
 
         self.assertEqual(True, (target == HotspotDetector.vza).all())
 
@@ -74,7 +77,7 @@ class MyTestCase(unittest.TestCase):
 
         product = utils.extract_zip(path_to_data, path_to_temp)
         HotspotDetector = SLSDetector(product)
-        HotspotDetector.run_detector()
+        HotspotDetector.run_detector(flares_or_sampling=True)
 
         self.assertEqual(True, (target == HotspotDetector.vza_mask).all())
 
@@ -91,6 +94,42 @@ class MyTestCase(unittest.TestCase):
 
         self.assertEqual(True, (target == HotspotDetector.hotspots).all())
 
+    def test_sparse_angles_sls(self):
+        path_to_data = glob.glob("../../data/test_data/S3A*.zip")[0]
+        path_to_temp = "../../data/temp/"
+
+        product = utils.extract_zip(path_to_data, path_to_temp)
+        DenseDetector = SLSDetector(product)
+        DenseDetector.run_detector(flares_or_sampling=True)
+        SparseDetector = SLSDetector(product)
+        SparseDetector.run_detector()
+
+        candidates = SparseDetector.potential_hotspots
+        self.assertEqual(True, (DenseDetector.hotspots == SparseDetector.hotspots).all())
+        self.assertEqual(True, (DenseDetector.sza[candidates] == SparseDetector.sza[candidates]).all())
+        self.assertEqual(True, (DenseDetector.vza[candidates] == SparseDetector.vza[candidates]).all())
+
+    def test_packed_threshold_sls(self):
+        path_to_data = glob.glob("../../data/test_data/S3A*.zip")[0]
+        path_to_temp = "../../data/temp/"
+
+        product = utils.extract_zip(path_to_data, path_to_temp)
+        HotspotDetector = SLSDetector(product)
+        HotspotDetector.run_detector()
+
+        swir_16 = product['S5_radiance_an']['S5_radiance_an'][:].filled(0)
+        self.assertEqual(True, ((swir_16 > HotspotDetector.swir_thresh) == HotspotDetector.potential_hotspots).all())
+
+    def test_unpack(self):
+        dtype = [('scale_factor', 'f4'), ('add_offset', 'f4'), ('_FillValue', 'i2'), ('valid_max', 'i2')]
+        packing = np.array([(0.5, 1, -32768, 100)], dtype=dtype)
+        counts = np.array([-32768, 0, 3, 100, 101], dtype=np.int16)
+
+        result = _unpack(counts, packing)
+        self.assertEqual([0, 1, 2.5, 51, 0], result.tolist())
+        self.assertEqual(np.float32, result.dtype)
+        self.assertEqual(True, (counts[result > 2] > _count_threshold(2, packing, counts.dtype)).all())
+
     def test_detect_hotspots_atx(self):
         path_to_data = glob.glob("../../data/test_data/*.N1")[0]
         path_to_target = "../../data/test_data/atx_detect_hotspots.npy"
@@ -101,7 +140,9 @@ class MyTestCase(unittest.TestCase):
         HotspotDetector = ATXDetector(product)
         HotspotDetector.run_detector()
 
-        self.assertEqual(True, (target == HotspotDetector.hotspots).all())
+        hotspots = np.zeros(target.shape, dtype=bool)
+        hotspots[HotspotDetector.rows] = HotspotDetector.hotspots
+        self.assertEqual(True, (target == hotspots).all())
 
     def test_cloud_free_atx(self):
 
@@ -114,19 +155,7 @@ class MyTestCase(unittest.TestCase):
         HotspotDetector = ATXDetector(product)
         HotspotDetector.run_detector()
 
-        self.assertEqual(True, (target == HotspotDetector.cloud_free).all())
-
-    def test_get_arcmin_int(self):
-
-        coords = np.array([-150.53434, -100.13425, -50.20493, 0.34982, 50.43562, 100.12343, 150.56443])
-        target = np.array([-15032, -10008, -5012, 21, 5026, 10007, 15034])
-
-        path_to_data = glob.glob("../../data/test_data/*.N1")[0]
-        product = epr.Product(path_to_data)
-        HotspotDetector = ATXDetector(product)
-
-        result = HotspotDetector._find_arcmin_gridcell(coords)
-        self.assertEqual(True, (target == result).all())
+        self.assertEqual(True, (target[HotspotDetector.rows] == HotspotDetector.cloud_free).all())
 
     def test_radiance_from_reflectance(self):
 
@@ -167,11 +196,116 @@ class MyTestCase(unittest.TestCase):
         product = epr.Product(path_to_data)
         HotspotDetector = ATXDetector(product)
         HotspotDetector.run_detector(flares_or_sampling=True)
+        HotspotDetector._compute_frp()  # frp is otherwise only computed at the output pixels
 
         path_to_target = "../../data/test_data/atx_frp.npy"
         target = np.load(path_to_target)
         result = HotspotDetector.frp
-        self.assertEqual(True, (target == result).all())
+        self.assertEqual(True, (target[HotspotDetector.rows] == result).all())
+
+    def test_reflectance_threshold_atx(self):
+        path_to_data = glob.glob("../../data/test_data/*.N1")[0]
+        product = epr.Product(path_to_data)
+        HotspotDetector = ATXDetector(product)
+        HotspotDetector.run_detector(flares_or_sampling=True)
+
+        swir_16 = np.nan_to_num(HotspotDetector._rad_from_ref(HotspotDetector.swir_16_reflectance))
+        mwir = HotspotDetector._rad_from_BT(3.7, HotspotDetector.mwir_brightness_temp)
+        self.assertEqual(True, ((swir_16 > HotspotDetector.swir_thresh) == HotspotDetector.potential_hotspots).all())
+        self.assertEqual(True, ((mwir > 0) == HotspotDetector._valid_mwir()).all())
+
+    def test_pointwise_window_statistics_atx(self):
+        path_to_data = glob.glob("../../data/test_data/*.N1")[0]
+        product = epr.Product(path_to_data)
+        HotspotDetector = ATXDetector(product)
+        HotspotDetector.run_detector(flares_or_sampling=True)
+
+        keys = ['latitude', 'longitude', 'local_cloudiness', 'background_mwir', 'frp']
+        result = HotspotDetector.to_dataframe(keys=keys)
+
+        HotspotDetector._compute_local_cloudiness()
+        HotspotDetector._compute_background()
+        HotspotDetector._compute_frp()
+        target = HotspotDetector.to_dataframe(keys=keys)
+
+        self.assertEqual(True, np.allclose(target.local_cloudiness, result.local_cloudiness))
+        self.assertEqual(True, np.allclose(target.background_mwir, result.background_mwir))
+        self.assertEqual(True, (target.frp == result.frp).all())
+
+        # chunked evaluation of the background windows
+        lines, samples = np.where(HotspotDetector.hotspots)
+        chunked = HotspotDetector._background_mwir_at(lines, samples, chunk_size=1000)
+        self.assertEqual(True, (HotspotDetector._background_mwir_at(lines, samples) == chunked).all())
+
+    def test_daytime_product_atx(self):
+        path_to_data = glob.glob("../../data/test_data/*.N1")[0]
+        product = epr.Product(path_to_data)
+        HotspotDetector = ATXDetector(product, day_night_angle=180)
+        HotspotDetector.run_detector(flares_or_sampling=True)
+        result = HotspotDetector.to_dataframe(keys=['latitude', 'longitude', 'frp'])
+
+        self.assertEqual(True, HotspotDetector.empty)
+        self.assertEqual(None, HotspotDetector.swir_16_reflectance)
+        self.assertEqual(0, len(result))
+
+    def test_row_windows(self):
+        flagged_rows = np.zeros(100, dtype=bool)
+        flagged_rows[[0, 10, 11, 50, 60]] = True
+
+        result = _row_windows(flagged_rows, 4)
+        self.assertEqual([(0, 5), (6, 16), (46, 55), (56, 65)], result)
+        self.assertEqual([], _row_windows(np.zeros(100, dtype=bool), 4))
+        self.assertEqual([(3, 5), (8, 9)], _windows_from_rows(np.array([3, 4, 8])))
+
+    def test_tiled_run_atx(self):
+        path_to_data = glob.glob("../../data/test_data/*.N1")[0]
+        product = epr.Product(path_to_data)
+        requests = [{'keys': ['latitude', 'longitude', 'local_cloudiness', 'frp', 'background_mwir']},
+                    {'keys': ['latitude', 'longitude', 'local_cloudiness'], 'sampling': True}]
+
+        targets = ATXDetector(product).run_tiled(requests, flares_or_sampling=True)
+        results = ATXDetector(product).run_tiled(requests, tile_rows=100, flares_or_sampling=True)
+        for target, result in zip(targets, results):
+            self.assertEqual(True, target.equals(result))
+
+        results = ATXDetector(product).run_tiled(requests, tile_rows=100, flares_or_sampling=True, threads=4)
+        for target, result in zip(targets, results):
+            self.assertEqual(True, target.equals(result))
+
+        # the rows are screened in blocks
+        target_rows, _ = ATXDetector(product)._flag_rows()
+        result_rows, _ = ATXDetector(product)._flag_rows(block_rows=100)
+        self.assertEqual(True, (target_rows == result_rows).all())
+
+    def test_night_sampling(self):
+        path_to_temp = "../../data/temp/"
+        products = [(ATXDetector, epr.Product(glob.glob("../../data/test_data/*.N1")[0])),
+                    (SLSDetector, utils.extract_zip(glob.glob("../../data/test_data/S3A*.zip")[0], path_to_temp))]
+
+        for Detector, product in products:
+            HotspotDetector = Detector(product)
+            HotspotDetector.run_detector(flares_or_sampling=True)
+            result = HotspotDetector.to_dataframe(keys=['latitude', 'longitude', 'sza'], sampling=True)
+
+            self.assertEqual(HotspotDetector.night_mask.sum(), len(result))
+            self.assertEqual(True, (result.sza >= HotspotDetector.day_night_angle).all())
+
+    def test_float32_equivalence_atx(self):
+        path_to_data = glob.glob("../../data/test_data/*.N1")[0]
+        product = epr.Product(path_to_data)
+        keys = ['latitude', 'longitude', 'local_cloudiness', 'swir_16', 'frp', 'pixel_size', 'mwir', 'background_mwir']
+
+        TargetDetector = ATXDetector(product)
+        TargetDetector.run_detector(flares_or_sampling=True)
+        target = TargetDetector.to_dataframe(keys=keys)
+        ResultDetector = ATXDetector(product, dtype='float32')
+        ResultDetector.run_detector(flares_or_sampling=True)
+        result = ResultDetector.to_dataframe(keys=keys)
+
+        self.assertEqual(True, (TargetDetector.hotspots == ResultDetector.hotspots).all())
+        self.assertEqual(True, (TargetDetector.background_mask == ResultDetector.background_mask).all())
+        for k in keys:
+            self.assertEqual(True, np.allclose(target[k], result[k], rtol=1e-6, atol=0))
 
     # -----------------
     # functional tests
@@ -0,0 +1,29 @@
+import unittest
+import numpy as np
+
+from src.ggf import gridcells
+
+
+class MyTestCase(unittest.TestCase):
+
+    def test_encode_decode(self):
+        coords = np.array([-150.53434, -100.13425, -50.20493, 0.34982, 50.43562, 100.12343, 150.56443])
+        target = np.array([-15032, -10008, -5012, 21, 5026, 10007, 15034])  # degrees * 100 + minutes
+        target = np.sign(target) * (np.abs(target) // 100 + np.abs(target) % 100 / 60)
+
+        latitude, longitude = gridcells.decode(gridcells.encode(coords / 2, coords))
+        self.assertEqual(True, np.allclose(target, longitude))
+        self.assertEqual(True, np.allclose(np.around(coords / 2 * 60) / 60, latitude))
+
+    def test_encode_unique(self):
+        latitude, longitude = np.meshgrid(np.arange(-90, 90.01, 0.5), np.arange(-180, 180.01, 0.5))
+        cells = gridcells.encode(latitude, longitude)
+        self.assertEqual(cells.size, np.unique(cells).size)
+
+    def test_encode_invalid(self):
+        cells = gridcells.encode(np.array([-999, np.nan, 0]), np.array([0, 0, 180.1]))
+        self.assertEqual(True, (cells == gridcells.invalid_cell).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+import numpy as np
+
+from src.scripts.identify_persistent_hotspots import months_to_annual_counts, load_monthly_detections
+from src.ggf import cell_summaries
+from src.utils import iter_summaries
+
+
+class MyTestCase(unittest.TestCase):
+
+    def test_months_to_annual_counts(self):
+        rng = np.random.RandomState(0)
+        df = pd.DataFrame({'cell': rng.randint(0, 200, 5000) * 1000,
+                           'year': rng.randint(1996, 2000, 5000),
+                           'month': rng.randint(1, 13, 5000)})
+        df = df[~((df.year == 1997) & (df.month == 5))]  # month without detections
+        df = df.drop_duplicates().reset_index(drop=True)
+
+        # count detections in the ~365 day period from each month with detections
+        dt = pd.to_datetime(df[['year', 'month']].assign(day=1))
+        target = []
+        for start_dt in sorted(dt.unique()):
+            sub_df = df[(start_dt <= dt) & (dt < start_dt + pd.to_timedelta(365, unit='days'))]
+            target.append(sub_df.groupby('cell', as_index=False).size().rename(columns={'size': 'counter'}))
+        target = pd.concat(target, ignore_index=True)
+
+        result = months_to_annual_counts(df, chunk_size=37)
+        self.assertEqual(True, (target.values == result.values).all())
+
+    def test_load_monthly_detections(self):
+        rng = np.random.RandomState(0)
+        cols = ['cell', 'year', 'month']
+        with tempfile.TemporaryDirectory() as path_to_temp:
+            paths = []
+            for i in range(10):
+                df = pd.DataFrame({'latitude': rng.rand(50),
+                                   'cell': rng.randint(0, 20, 50),
+                                   'year': 2000,
+                                   'month': rng.randint(1, 4, 50)})
+                paths.append(os.path.join(path_to_temp, f"{i}_hotspots.csv"))
+                df.to_csv(paths[-1])
+            target = pd.concat([pd.read_csv(p, usecols=cols) for p in paths]).drop_duplicates()
+            result = load_monthly_detections(paths, cols=cols, chunk_size=3)
+
+        self.assertEqual(sorted(map(tuple, target.values)), sorted(map(tuple, result.values)))
+
+    def test_load_monthly_summaries(self):
+        rng = np.random.RandomState(0)
+        cols = ['cell', 'year', 'month']
+        with tempfile.TemporaryDirectory() as path_to_temp:
+            paths = []
+            target = []
+            for i in range(10):
+                df = pd.DataFrame({'cell': rng.randint(0, 20, 50), 'swir_16': rng.rand(50)})
+                orbit = {'year': '2000', 'month': str(rng.randint(1, 4)), 'day': '01', 'hhmm': '0000', 'sensor': 'ats'}
+                paths.append(os.path.join(path_to_temp, f"{i}_hotspots.npz"))
+                cell_summaries.save(cell_summaries.summarise(df, orbit), paths[-1])
+                target.append(df.assign(year=2000, month=int(orbit['month']))[cols])
+            target = pd.concat(target).drop_duplicates()
+            result = load_monthly_detections(paths, cols=cols, chunk_size=3, reader=iter_summaries)
+
+        self.assertEqual(sorted(map(tuple, target.values)), sorted(map(tuple, result.values)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+
+from src.ggf import gridcells
+from src.ggf import persistent_index
+
+
+class MyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        latitude = np.array([-90, -50.20493, -0.34982, 0, 0.34982, 50.43562, 90])
+        longitude = np.array([-180, -150.53434, -100.13425, 0, 100.12343, 150.56443, 180])
+        self.cells = gridcells.encode(latitude, longitude)
+
+    def test_contains(self):
+        index = persistent_index.build(self.cells[::2])
+
+        target = np.array([True, False, True, False, True, False, True])
+        result = persistent_index.contains(index, self.cells)
+        self.assertEqual(True, (target == result).all())
+
+    def test_contains_invalid_cells(self):
+        index = persistent_index.build(self.cells)
+        result = persistent_index.contains(index, np.array([gridcells.invalid_cell, gridcells.n_cells]))
+        self.assertEqual(False, result.any())
+
+    def test_union(self):
+        index_a = persistent_index.build(self.cells[:2])
+        index_b = persistent_index.build(self.cells[-2:])
+        result = persistent_index.contains(persistent_index.union(index_a, index_b), self.cells)
+        target = np.array([True, True, False, False, False, True, True])
+        self.assertEqual(True, (target == result).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
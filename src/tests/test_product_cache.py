@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from src.ggf.product_cache import ProductCache
+
+
+class MyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.array = np.arange(1000, dtype=np.float32).reshape(20, 50)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        cache = ProductCache(self.root, 2 ** 30)
+        masked = np.ma.masked_less(self.array, 10)
+        cache.put('product', 'swir_16', self.array)
+        cache.put('product', 'latitude', masked)
+        cache.put_meta('product', {'sensor': 'ats'})
+
+        self.assertEqual(True, cache.contains('product'))
+        self.assertEqual({'sensor': 'ats'}, cache.get_meta('product'))
+        self.assertEqual(True, (cache.get('product', 'swir_16') == self.array).all())
+        result = cache.get('product', 'latitude')
+        self.assertEqual(True, (result.mask == masked.mask).all())
+        self.assertEqual(None, cache.get('product', 'mwir'))
+
+    def test_put_rows(self):
+        cache = ProductCache(self.root, 2 ** 30)
+        masked = np.ma.masked_less(self.array, 10)
+        cache.put_rows('product', 'swir_16', 20, lambda start, stop: self.array[start:stop], block_rows=3)
+        cache.put_rows('product', 'latitude', 20, lambda start, stop: masked[start:stop], block_rows=3)
+
+        result = cache.get('product', 'swir_16')
+        self.assertEqual(False, np.ma.isMaskedArray(result))
+        self.assertEqual(True, (result == self.array).all())
+        result = cache.get('product', 'latitude')
+        self.assertEqual(True, (result.data == masked.data).all())
+        self.assertEqual(True, (result.mask == masked.mask).all())
+        self.assertEqual(['latitude.npy', 'latitude_mask.npy', 'swir_16.npy'],
+                         sorted(os.listdir(os.path.join(self.root, 'product'))))
+
+    def test_incomplete_entry(self):
+        cache = ProductCache(self.root, 2 ** 30)
+        cache.put('product', 'swir_16', self.array)
+        self.assertEqual(False, cache.contains('product'))
+
+    def test_lru_eviction(self):
+        cache = ProductCache(self.root, 3.5 * self.array.nbytes)
+        for i, product_id in enumerate(['a', 'b', 'c']):
+            cache.put(product_id, 'swir_16', self.array)
+            cache.put_meta(product_id, {})
+            os.utime(os.path.join(self.root, product_id), (i, i))
+
+        # accessing a makes b the least recently used product
+        cache.get_meta('a')
+        cache.put('d', 'swir_16', self.array)
+        cache.put_meta('d', {})
+
+        result = [cache.contains(product_id) for product_id in ['a', 'b', 'c', 'd']]
+        self.assertEqual([True, False, True, True], result)
+
+
+if __name__ == '__main__':
+    unittest.main()
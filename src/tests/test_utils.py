@@ -1,6 +1,15 @@
-import unittest
+import os
 import glob
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+import numpy as np
+
 import src.utils as utils
+import src.config.constants as proc_const
+import src.config.filepaths as fp
 
 
 class MyTestCase(unittest.TestCase):
@@ -12,7 +21,6 @@ class MyTestCase(unittest.TestCase):
                   "geometry_tn": None,
                   "cartesian_an": None,
                   "cartesian_tx": None,
-                  "indices_an": None,
                   "flags_an": None,
                   'time_an': None}
         path_to_data = glob.glob("../../data/test_data/S3A*.zip")[0]
@@ -20,3 +28,91 @@ class MyTestCase(unittest.TestCase):
 
         result = utils.extract_zip(path_to_data, path_to_temp)
         self.assertEqual(target.keys(), result.keys())
+
+    def test_read_zip(self):
+        path_to_data = glob.glob("../../data/test_data/S3A*.zip")[0]
+        path_to_temp = "../../data/temp/"
+
+        target = utils.extract_zip(path_to_data, path_to_temp)
+        result = utils.read_zip(path_to_data)
+        self.assertEqual(target.keys(), result.keys())
+        for k in target:
+            for v in utils.slstr_variables[k]:
+                self.assertEqual(True, (target[k][v][:] == result[k][v][:]).all())
+                self.assertEqual(True, (target[k][v][:].mask == result[k][v][:].mask).all())
+        self.assertEqual(target['time_an'].start_time, result['time_an'].start_time)
+
+        # the members are read as raw bytes and released once opened
+        contents = utils.read_zip_members(path_to_data)
+        self.assertEqual(True, all(isinstance(content, bytes) for content in contents.values()))
+        self.assertEqual(target.keys(), utils.open_zip_members(contents).keys())
+        self.assertEqual({}, contents)
+
+    def test_prefetch_file(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(os.urandom(1000))
+            f.flush()
+            self.assertEqual(f.name, utils.prefetch_file(f.name, chunk_size=64, max_workers=4))
+
+    def test_evicted_cache_entry(self):
+        path_to_data = glob.glob("../../data/test_data/S3A*.zip")[0]
+        product_id = os.path.basename(path_to_data)
+
+        with tempfile.TemporaryDirectory() as cache_dir, mock.patch.object(fp, 'product_cache', cache_dir):
+            detector = utils.open_detector(path_to_data, 'sls', utils.read_product(path_to_data, 'sls'))
+            detector.run_detector()
+            data = utils.read_product(path_to_data, 'sls')
+            self.assertEqual(None, data)
+
+            # the entry is evicted by another task before the product is opened
+            shutil.rmtree(os.path.join(cache_dir, product_id))
+            detector = utils.open_detector(path_to_data, 'sls', data)
+            self.assertEqual(False, detector.product is None)
+
+    def test_pipeline_products(self):
+        written = []
+
+        def read(product, sensor):
+            if product == 'b':
+                raise IOError('unreadable product')
+            return product.upper()
+
+        def detect(product, sensor, data):
+            if product == 'c':
+                raise ValueError('detection failed')
+            return data + sensor
+
+        def write(product, sensor, results):
+            written.append(results)
+
+        failed = utils.pipeline_products(read, detect, write, iter(['a', 'b', 'c', 'd', 'e']), 'ats', depth=1)
+        self.assertEqual(2, failed)
+        self.assertEqual(['Aats', 'Dats', 'Eats'], written)
+
+    def test_load_csvs(self):
+        rng = np.random.RandomState(0)
+        with tempfile.TemporaryDirectory() as path_to_temp:
+            paths = []
+            for i in range(4):
+                df = pd.DataFrame({'cell': rng.randint(0, 1000, 5),
+                                   'year': 2000 + i,
+                                   'latitude': rng.rand(5),
+                                   'unused': rng.rand(5)})
+                paths.append(os.path.join(path_to_temp, f"{i}_flares.csv"))
+                df.to_csv(paths[-1])
+            target = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+
+            result = utils.load_csvs(paths, dtypes=proc_const.csv_dtypes, processes=2)
+            subset = utils.load_csvs(paths, cols=['cell', 'year'], dtypes=proc_const.csv_dtypes, processes=2)
+
+        # only the typed columns are kept, in the order of the input files
+        self.assertEqual(['cell', 'year', 'latitude'], list(result.columns))
+        self.assertEqual(np.int32, result.cell.dtype)
+        self.assertEqual(np.int16, result.year.dtype)
+        self.assertEqual(np.float32, result.latitude.dtype)
+        self.assertEqual(target.cell.tolist(), result.cell.tolist())
+        self.assertEqual(target.year.tolist(), result.year.tolist())
+        self.assertEqual(True, np.allclose(target.latitude, result.latitude))
+
+        self.assertEqual(['cell', 'year'], list(subset.columns))
+        self.assertEqual(target.cell.tolist(), subset.cell.tolist())
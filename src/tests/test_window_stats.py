@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from scipy.ndimage import convolve
+
+from src.ggf import window_stats
+
+
+class MyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.image = rng.rand(120, 45)
+        self.mask = rng.rand(120, 45) > 0.7
+
+    def test_window_sum(self):
+        for size in [1, 3, 17, 33]:
+            kernel = np.ones([size, size])
+            target = convolve(self.image, kernel, mode='constant', cval=0)
+            result = window_stats.window_sum(self.image, size)
+            self.assertEqual(True, np.allclose(target, result))
+
+    def test_window_sum_mask(self):
+        kernel = np.ones([17, 17])
+        target = convolve(self.mask.astype(int), kernel, mode='constant', cval=0)
+        result = window_stats.window_sum(self.mask, 17)
+        self.assertEqual(True, (target == result).all())
+
+    def test_window_count(self):
+        kernel = np.ones([33, 33])
+        target = convolve(np.ones(self.mask.shape), kernel, mode='constant', cval=0.0)
+        result = window_stats.window_count(self.mask.shape, 33)
+        self.assertEqual(True, (target == result).all())
+
+    def test_window_mean(self):
+        kernel = np.ones([33, 33])
+        s = convolve(self.mask.astype(int), kernel, mode='constant', cval=0.0)
+        count = convolve(np.ones(self.mask.shape), kernel, mode='constant', cval=0.0)
+        result = window_stats.window_mean(self.mask, 33)
+        self.assertEqual(True, np.allclose(s / count, result))
+
+    def test_point_statistics(self):
+        lines = np.array([0, 5, 60, 119, 119])
+        samples = np.array([0, 44, 20, 3, 44])
+        for size in [3, 17, 33]:
+            target = window_stats.window_sum(self.image, size)[lines, samples]
+            result = window_stats.point_sum(self.image, size, lines, samples, chunk_size=size ** 2)
+            self.assertEqual(True, np.allclose(target, result))
+
+            target = window_stats.window_mean(self.mask, size)[lines, samples]
+            result = window_stats.point_mean(self.mask, size, lines, samples)
+            self.assertEqual(True, np.allclose(target, result))
+
+
+if __name__ == '__main__':
+    unittest.main()
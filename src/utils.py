@@ -1,14 +1,39 @@
 
 import os
+import sys
+import queue
 import shutil
+import threading
 import zipfile
+import tempfile
+import traceback
+from functools import partial
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
 
 
+import epr
 import numpy as np
+import pandas as pd
 from netCDF4 import Dataset
 
 
 import src.config.filepaths as fp
+import src.config.constants as proc_const
+from src.ggf.product_cache import ProductCache
+from src.ggf.detectors import ATXDetector, SLSDetector
+from src.ggf import cell_summaries
+
+# NetCDF members of the SLSTR product used in processing and the variables read from each
+slstr_variables = {'S5_radiance_an': ['S5_radiance_an'],
+                   'S6_radiance_an': ['S6_radiance_an'],
+                   'geodetic_an': ['latitude_an', 'longitude_an'],
+                   'geometry_tn': ['solar_zenith_tn', 'sat_zenith_tn'],
+                   'cartesian_an': ['x_an', 'y_an'],
+                   'cartesian_tx': ['x_tx', 'y_tx'],
+                   'flags_an': ['cloud_an'],
+                   'time_an': []}
+slstr_members = [member + '.nc' for member in slstr_variables]
 
 
 def planck_radiance(wvl, temp):
@@ -27,14 +52,10 @@ def planck_radiance(wvl, temp):
 
 def extract_zip(input_zip, path_to_temp):
     data_dict = {}
-    to_extract = ["S5_radiance_an.nc", "S6_radiance_an.nc",
-                  "geodetic_an.nc", "geometry_tn.nc",
-                  "cartesian_an.nc", "cartesian_tx.nc",
-                  "indices_an.nc", "flags_an.nc", "time_an.nc"]
     with zipfile.ZipFile(input_zip) as nc_file:
         for name in nc_file.namelist():
             split_name = name.split('/')[-1]
-            if split_name in to_extract:
+            if split_name in slstr_members:
                 var_name = split_name.split('.')[0]
                 source = Dataset(nc_file.extract(name, path_to_temp))
                 data_dict[var_name] = source
@@ -49,14 +70,486 @@ def extract_zip(input_zip, path_to_temp):
     return data_dict
 
 
+def _read_member(input_zip, name):
+    """
+    Decompresses a single member of a zip file into memory.  Each call
+    opens its own handle on the zip file so members can be read concurrently.
+
+    Args:
+        input_zip: Path to the zip file
+        name: Name of the member
+
+    Returns:
+        The member contents
+    """
+    with zipfile.ZipFile(input_zip) as nc_file:
+        return nc_file.read(name)
+
+
+class MemoryVariable(object):
+
+    def __init__(self, variable):
+        """
+        In memory copy of a NetCDF variable, supporting the parts of the
+        netCDF4.Variable interface used by the detectors (slicing, with or
+        without auto masking and scaling, and the attributes), so that the
+        dataset it was read from can be closed.  The packed data is held along
+        with the mask applied by netCDF4, and is scaled in the same way as netCDF4
+        when it is sliced.
+
+        Args:
+            variable: netCDF4 variable (with the default auto masking and scaling)
+        """
+        self._attributes = {k: variable.getncattr(k) for k in variable.ncattrs()}
+        self.shape = variable.shape
+        self.mask = self.scale = True
+        if 'scale_factor' in self._attributes or 'add_offset' in self._attributes:
+            self._mask = np.ma.getmask(variable[:])
+            variable.set_auto_maskandscale(False)
+            self._data = variable[:]
+            variable.set_auto_maskandscale(True)
+        else:
+            # the masked data of unpacked variables is left unchanged by netCDF4
+            data = variable[:]
+            self._data = np.ma.getdata(data)
+            self._mask = np.ma.getmask(data)
+
+    def ncattrs(self) -> list:
+        return list(self._attributes)
+
+    def getncattr(self, name):
+        return self._attributes[name]
+
+    def set_auto_maskandscale(self, value) -> None:
+        self.mask = self.scale = value
+
+    def set_auto_mask(self, value) -> None:
+        self.mask = value
+
+    def set_auto_scale(self, value) -> None:
+        self.scale = value
+
+    def __getitem__(self, key):
+        data = self._data[key]
+        if self.scale:
+            scale_factor = self._attributes.get('scale_factor')
+            add_offset = self._attributes.get('add_offset')
+            if scale_factor is not None and add_offset is not None:
+                data = data * scale_factor + add_offset
+            elif scale_factor is not None:
+                data = data * scale_factor
+            elif add_offset is not None:
+                data = data + add_offset
+        if not self.mask:
+            return data
+        return np.ma.masked_array(data, mask=self._mask if self._mask is np.ma.nomask else self._mask[key])
+
+
+class MemoryDataset(dict):
+
+    def __init__(self, dataset, names):
+        """
+        In memory copy of the given variables and the global attributes
+        of a NetCDF dataset, accessed in the same way as the dataset.
+
+        Args:
+            dataset: netCDF4 dataset
+            names: Names of the variables to copy
+        """
+        super().__init__((name, MemoryVariable(dataset[name])) for name in names)
+        self._attributes = {k: dataset.getncattr(k) for k in dataset.ncattrs()}
+
+    def __getattr__(self, name):
+        try:
+            return self._attributes[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def read_zip_members(input_zip, max_workers=proc_const.product_read_threads) -> dict:
+    """
+    Decompresses the NetCDF members of a zipped SLSTR product needed for
+    processing into memory, without opening them.  The members are
+    decompressed concurrently.  Only the zip library is used, so this can
+    run on any thread.
+
+    Args:
+        input_zip: Path to the zipped SLSTR product
+        max_workers: Number of members decompressed at once
+
+    Returns:
+        Dictionary of the member contents keyed by member name
+    """
+    with zipfile.ZipFile(input_zip) as nc_file:
+        names = {name.split('/')[-1].split('.')[0]: name for name in nc_file.namelist()
+                 if name.split('/')[-1] in slstr_members}
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        return dict(zip(names, pool.map(partial(_read_member, input_zip), names.values())))
+
+
+def open_zip_members(contents) -> dict:
+    """
+    Opens the decompressed members of an SLSTR product from memory in
+    turn (the NetCDF library is not thread safe), copying the variables
+    needed for processing and releasing each member buffer once read.
+
+    Args:
+        contents: Dictionary of the member contents keyed by member name (emptied as they are read)
+
+    Returns:
+        Dictionary of in memory datasets keyed by member name (accessed as extract_zip)
+    """
+    product = {}
+    for member in list(contents):
+        with Dataset(member, memory=contents.pop(member)) as dataset:
+            product[member] = MemoryDataset(dataset, slstr_variables[member])
+    return product
+
+
+def read_zip(input_zip, max_workers=proc_const.product_read_threads) -> dict:
+    """
+    Reads the variables of a zipped SLSTR product needed for processing
+    directly from memory, without extracting the product to disk.
+
+    Args:
+        input_zip: Path to the zipped SLSTR product
+        max_workers: Number of members decompressed at once
+
+    Returns:
+        Dictionary of in memory datasets keyed by member name (accessed as extract_zip)
+    """
+    return open_zip_members(read_zip_members(input_zip, max_workers))
+
+
+def prefetch_file(path, chunk_size=2 ** 24, max_workers=proc_const.product_read_threads) -> str:
+    """
+    Reads a file through in chunks without keeping its contents, so that
+    it is held in the page cache when it is next opened (e.g. by epr, whose
+    band reads are otherwise issued one after another).  The chunks are read
+    concurrently so that the latency of the reads overlaps.  Only plain file
+    I/O is used, so this can run on any thread.
+
+    Args:
+        path: Path to the file
+        chunk_size: Number of bytes read at once
+        max_workers: Number of chunks read at once
+
+    Returns:
+        The path
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offsets = range(0, os.fstat(fd).st_size, chunk_size)
+        with ThreadPoolExecutor(max_workers) as pool:
+            for _ in pool.map(lambda offset: len(os.pread(fd, chunk_size, offset)), offsets):
+                pass
+    finally:
+        os.close(fd)
+    return path
+
+
+def open_product_cache():
+    """
+    Opens the preprocessed product cache, if one is configured.
+
+    Returns:
+        ProductCache or None if caching is disabled
+    """
+    if fp.product_cache is None:
+        return None
+    return ProductCache(fp.product_cache, proc_const.product_cache_max_bytes)
+
+
 def build_outpath(sensor, f, stage):
 
     # separate file from path
     fname = f.split('/')[-1]
     ymd = fname[16:24] if sensor == 'sls' else fname[14:22]
-    fname = fname.split('.')[0] + ''.join(['_', stage, '.csv'])
+    extension = '.npz' if stage == 'hotspots' else '.csv'  # hotspots are stored as grid cell summaries
+    fname = fname.split('.')[0] + ''.join(['_', stage, extension])
     return os.path.join(fp.output_l2, sensor, ymd[0:4], ymd[4:6], ymd[6:8], fname)
 
 
+def write_manifest(filepaths, path_to_temp) -> str:
+    """
+    Writes the products to be processed to a manifest file,
+    one product per line.
+
+    Args:
+        filepaths: List of products to process
+        path_to_temp: Directory in which the manifest is written
+
+    Returns:
+        Path to the manifest file
+    """
+    (gd, manifest) = tempfile.mkstemp('.txt', 'ggf.manifest.', path_to_temp, True)
+    with os.fdopen(gd, "w") as g:
+        g.write("\n".join(filepaths) + "\n")
+    return manifest
+
+
+def read_manifest(manifest, task_id=None, products_per_task=None) -> list:
+    """
+    Reads the products listed in a manifest file.  If a task id is
+    given only the chunk of products assigned to that task is returned.
+
+    Args:
+        manifest: Path to the manifest file
+        task_id: Index of the task (e.g. the slurm array task id)
+        products_per_task: Number of products processed by each task
+
+    Returns:
+        List of products
+    """
+    with open(manifest) as f:
+        products = [line.strip() for line in f if line.strip()]
+    if task_id is None:
+        return products
+    return products[task_id * products_per_task:(task_id + 1) * products_per_task]
+
+
+def read_products(product_list=None):
+    """
+    Reads the products to process, one per line, from a file or
+    from stdin.  Products are yielded as they are read, so that a
+    worker reading from stdin can be fed products as they arrive.
+
+    Args:
+        product_list: Path to a file listing the products (stdin if None or '-')
+
+    Returns:
+        Generator of products
+    """
+    f = sys.stdin if product_list in [None, '-'] else open(product_list)
+    try:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_product(file_to_process, sensor):
+    """
+    Reads the raw data of a product, without opening it, so that it can
+    run as the read stage of pipeline_products.  Products held in the
+    product cache are not read, and their cache entry is marked as
+    recently used so that it is not the next to be evicted.
+
+    Args:
+        file_to_process: Path to the product
+        sensor: Sensor code string
+
+    Returns:
+        None if the product is cached, otherwise the path of the (prefetched) ATSR
+        product or the decompressed SLSTR member contents
+    """
+    cache = open_product_cache()
+    if cache is not None and cache.get_meta(os.path.basename(file_to_process)) is not None:
+        return None
+    if sensor != 'sls':
+        return prefetch_file(file_to_process)
+    return read_zip_members(file_to_process)
+
+
+def open_detector(file_to_process, sensor, data):
+    """
+    Opens a product from the raw data returned by read_product and
+    constructs its detector, using the product cache if one is configured.
+    The product libraries are not thread safe, so this must run on the
+    thread that processes the product.  If the product was cached when it
+    was read, the cache is checked again, and the product is read from disk
+    if its entry has since been evicted (e.g. by another task).
+
+    Args:
+        file_to_process: Path to the product
+        sensor: Sensor code string
+        data: Raw product data returned by read_product
+
+    Returns:
+        ATXDetector or SLSDetector of the product
+    """
+    if data is None:
+        data = read_product(file_to_process, sensor)
+    cache = open_product_cache()
+    product_id = os.path.basename(file_to_process)
+    if sensor != 'sls':
+        product = None if data is None else epr.Product(data)
+        return ATXDetector(product, cache=cache, product_id=product_id)
+    product = None if data is None else open_zip_members(data)
+    return SLSDetector(product, cache=cache, product_id=product_id)
+
+
+def pipeline_products(read, detect, write, products, sensor, depth=proc_const.pipeline_depth) -> int:
+    """
+    Processes a set of products in the current interpreter as a pipeline
+    of three stages connected by bounded queues: a reader thread reading (and
+    decompressing) the raw data of the next products, the detector opening and
+    processing the current product in the calling thread, and a writer thread
+    writing the results of the previous products.  The reader must not call the
+    product libraries (epr and NetCDF/HDF5 are not thread safe), so products are
+    only opened by the detector stage.  The reader and detector block once depth
+    products are queued for the next stage, bounding the memory held.  Failures
+    are reported and only the failing product is dropped from the pipeline.
+
+    Args:
+        read: Function taking the product path and sensor and returning the raw product data
+        detect: Function taking the product path, sensor and raw product data and returning the results
+        write: Function taking the product path, sensor and results and writing the results
+        products: Iterable of products to process
+        sensor: Sensor code string
+        depth: Number of products queued between stages (at least one)
+
+    Returns:
+        The number of products that failed
+    """
+    failed = []
+    done = object()
+    read_queue = queue.Queue(maxsize=depth)
+    write_queue = queue.Queue(maxsize=depth)
+
+    def run_stage(stage, product, *args):
+        try:
+            return True, stage(product, sensor, *args)
+        except Exception:
+            failed.append(product)
+            print('Processing failed for', product, file=sys.stderr)
+            traceback.print_exc()
+            return False, None
+
+    def reader():
+        try:
+            for product in products:
+                succeeded, data = run_stage(read, product)
+                if succeeded:
+                    read_queue.put((product, data))
+        finally:
+            read_queue.put(done)
 
+    def writer():
+        for product, results in iter(write_queue.get, done):
+            run_stage(write, product, results)
 
+    # the reader is not joined, as it may be blocked on a full queue if the detector is interrupted
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    threading.Thread(target=reader, daemon=True).start()
+    writer_thread.start()
+    try:
+        for product, data in iter(read_queue.get, done):
+            succeeded, results = run_stage(detect, product, data)
+            del data  # release the product before waiting on the next one
+            if succeeded:
+                write_queue.put((product, results))
+    finally:
+        write_queue.put(done)
+        writer_thread.join()
+    return len(failed)
+
+
+def _read_csv(path, cols=None, dtypes=None, reduce=None):
+    """
+    Reads a single CSV file for iter_csvs.
+
+    Args:
+        path: csv file
+        cols: Columns to use (all if None and no dtypes are given)
+        dtypes: Mapping of column names to dtypes
+        reduce: Optional function applied to the dataframe
+
+    Returns:
+        The (reduced) dataframe, or None if the file is empty
+    """
+    if cols is None and dtypes is not None:
+        cols = lambda c: c in dtypes  # noqa: E731
+    try:
+        df = pd.read_csv(path, usecols=cols, dtype=dtypes)
+    except pd.errors.EmptyDataError:
+        return None
+    return df if reduce is None else reduce(df)
+
+
+def iter_csvs(paths, cols=None, dtypes=None, reduce=None, processes=None, chunksize=64):
+    """
+    Reads a set of CSV files in a process pool, yielding
+    the dataframes in the order of the input paths.  Empty
+    files are skipped.
+
+    Args:
+        paths: List of csv files
+        cols: Columns to use (all if None and no dtypes are given,
+            otherwise the columns in dtypes)
+        dtypes: Mapping of column names to dtypes
+        reduce: Optional function applied to each dataframe in the worker
+        processes: Number of worker processes (all cores if None)
+        chunksize: Number of files sent to a worker at once
+
+    Returns:
+        Generator of pandas dataframes
+    """
+    read = partial(_read_csv, cols=cols, dtypes=dtypes, reduce=reduce)
+    with Pool(processes) as pool:
+        for df in pool.imap(read, paths, chunksize):
+            if df is not None:
+                yield df
+
+
+def _read_summary(path, cols=None, dtypes=None, reduce=None):
+    """
+    Reads a single orbit grid cell summary for iter_summaries.
+
+    Args:
+        path: Summary file
+        cols: Columns to use (all if None)
+        dtypes: Mapping of column names to dtypes
+        reduce: Optional function applied to the dataframe
+
+    Returns:
+        The (reduced) dataframe
+    """
+    df = cell_summaries.load(path, cols=cols)
+    if dtypes is not None:
+        df = df.astype({k: v for k, v in dtypes.items() if k in df.columns})
+    return df if reduce is None else reduce(df)
+
+
+def iter_summaries(paths, cols=None, dtypes=None, reduce=None, processes=None, chunksize=64):
+    """
+    Reads a set of orbit grid cell summaries (see src.ggf.cell_summaries)
+    in a process pool, yielding the dataframes in the order of the input
+    paths, in the same way as iter_csvs.
+
+    Args:
+        paths: List of summary files
+        cols: Columns to use (all if None)
+        dtypes: Mapping of column names to dtypes
+        reduce: Optional function applied to each dataframe in the worker
+        processes: Number of worker processes (all cores if None)
+        chunksize: Number of files sent to a worker at once
+
+    Returns:
+        Generator of pandas dataframes
+    """
+    read = partial(_read_summary, cols=cols, dtypes=dtypes, reduce=reduce)
+    with Pool(processes) as pool:
+        for df in pool.imap(read, paths, chunksize):
+            yield df
+
+
+def load_csvs(paths, cols=None, dtypes=None, processes=None) -> pd.DataFrame:
+    """
+    Generate a dataframe from a set of CSV files retaining
+    specified columns, reading the files in parallel.
+
+    Args:
+        paths: List of csv files
+        cols: Columns to use (all if None and no dtypes are given,
+            otherwise the columns in dtypes)
+        dtypes: Mapping of column names to dtypes
+        processes: Number of worker processes (all cores if None)
+
+    Returns:
+        Pandas dataframe generated from the input CSV files
+    """
+    return pd.concat(iter_csvs(paths, cols=cols, dtypes=dtypes, processes=processes), ignore_index=True)